@@ -1,103 +1,285 @@
 from __future__ import annotations
 
+import atexit
 import hashlib
 import json
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
+from itertools import repeat
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except Exception:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def _dumps_line(record: Dict[str, Any]) -> str:
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(record).decode("utf-8")
+        except TypeError:
+            # orjson rejects a few values stdlib json accepts (e.g. >64-bit ints).
+            pass
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _loads(line: Any) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _utf8(value: Any) -> bytes:
+    return (value if isinstance(value, str) else str(value)).encode("utf-8")
+
+
+def _iter_lines(path: Path) -> Iterator[bytes]:
+    # Line boundaries are found on a read-only mapping rather than through
+    # the buffered text reader, so each record is sliced out once as bytes.
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            end = len(mm)
+            while pos < end:
+                nl = mm.find(b"\n", pos)
+                if nl < 0:
+                    nl = end
+                line = mm[pos:nl].strip()
+                if line:
+                    yield line
+                pos = nl + 1
+
+
+def _chain_hash(seed: bytes, prev_hash: Any, timestamp: Any, event_type: Any, payload: Any) -> str:
+    # The hashed payload form stays on stdlib json so existing chains keep
+    # verifying; only line encoding/decoding goes through orjson.
+    serialized_payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    base = b"|".join(
+        (seed, _utf8(prev_hash), _utf8(timestamp), _utf8(event_type), serialized_payload.encode("utf-8"))
+    )
+    return hashlib.sha256(base).hexdigest()
+
+
+def _verify_batch(seed: bytes, lines: List[bytes]) -> List[Tuple[Any, Any, str]]:
+    # Each digest depends only on its own record, so batches can be hashed
+    # independently; the chain links are checked afterwards in order.
+    results: List[Tuple[Any, Any, str]] = []
+    for line in lines:
+        try:
+            record = _loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            # Unparseable lines surface as a broken link at their position.
+            results.append((None, None, ""))
+            continue
+        recomputed = _chain_hash(
+            seed,
+            record.get("prev_hash", ""),
+            record.get("ts_utc", ""),
+            record.get("event_type", ""),
+            record.get("payload", {}),
+        )
+        results.append((record.get("prev_hash", ""), record.get("entry_hash", ""), recomputed))
+    return results
 
 
 class AuditLogger:
-    def __init__(self, log_path: str, hash_seed: str) -> None:
+    PARALLEL_VERIFY_MIN_ENTRIES = 20000
+    PARALLEL_VERIFY_BATCH_SIZE = 5000
+    HEAD_WRITE_INTERVAL_SECONDS = 60.0
+
+    def __init__(
+        self,
+        log_path: str,
+        hash_seed: str,
+        flush_max_records: int = 32,
+        flush_interval_seconds: float = 0.2,
+        fsync: bool = False,
+    ) -> None:
         self.log_path = Path(log_path)
         self.hash_seed = hash_seed
+        self._seed_bytes = hash_seed.encode("utf-8")
+        self.flush_max_records = max(1, flush_max_records)
+        self.flush_interval_seconds = max(0.0, flush_interval_seconds)
+        self.fsync = fsync
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._head_path = self.log_path.with_name(self.log_path.name + ".head")
         self._last_hash = self._load_last_hash()
 
+        # Records are buffered in memory and written through one long-lived
+        # handle; a flush happens on size/age thresholds, verify() and exit.
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._fh: Optional[TextIO] = None
+        # The .head sidecar lags the log between writes; a stale one fails
+        # the size check on load and falls back to a scan.
+        self._head_dirty = False
+        self._last_head_write = time.monotonic()
+        self._closed = threading.Event()
+        if self.flush_max_records > 1 and self.flush_interval_seconds > 0:
+            # The age threshold must hold even when no further append comes
+            # along to check it, or the tail of a burst would sit in memory
+            # until the next request.
+            threading.Thread(target=self._flush_periodically, name="audit-log-flush", daemon=True).start()
+        atexit.register(self.close)
+
     def append(self, event_type: str, payload: Dict[str, Any]) -> str:
-        timestamp = datetime.now(timezone.utc).isoformat()
-        serialized_payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
-        base = "%s|%s|%s|%s|%s" % (
-            self.hash_seed,
-            self._last_hash,
-            timestamp,
-            event_type,
-            serialized_payload,
-        )
-        entry_hash = hashlib.sha256(base.encode("utf-8")).hexdigest()
-        record = {
-            "ts_utc": timestamp,
-            "event_type": event_type,
-            "payload": payload,
-            "prev_hash": self._last_hash,
-            "entry_hash": entry_hash,
-        }
+        with self._lock:
+            timestamp = datetime.now(timezone.utc).isoformat()
+            entry_hash = _chain_hash(self._seed_bytes, self._last_hash, timestamp, event_type, payload)
+            record = {
+                "ts_utc": timestamp,
+                "event_type": event_type,
+                "payload": payload,
+                "prev_hash": self._last_hash,
+                "entry_hash": entry_hash,
+            }
+
+            self._buffer.append(_dumps_line(record) + "\n")
+            self._last_hash = entry_hash
+            self._maybe_flush()
+            return entry_hash
 
-        with self.log_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_buffer()
 
-        self._last_hash = entry_hash
-        return entry_hash
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            self._flush_buffer()
+            if self._fh is not None:
+                self._sync_head()
+                self._fh.close()
+                self._fh = None
 
     def verify(self) -> Dict[str, Any]:
+        self.flush()
         if not self.log_path.exists():
             return {"ok": True, "entries": 0, "last_hash": ""}
 
+        lines = list(_iter_lines(self.log_path))
+
         expected_prev = ""
-        entries = 0
-        with self.log_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                entries += 1
-                record = json.loads(line)
-                if record.get("prev_hash", "") != expected_prev:
-                    return {
-                        "ok": False,
-                        "entries": entries,
-                        "last_hash": expected_prev,
-                        "error": "Broken hash chain at line %s" % entries,
-                    }
-
-                recomputed = self._recompute_hash(record)
-                if recomputed != record.get("entry_hash", ""):
-                    return {
-                        "ok": False,
-                        "entries": entries,
-                        "last_hash": expected_prev,
-                        "error": "Hash mismatch at line %s" % entries,
-                    }
-                expected_prev = record.get("entry_hash", "")
-
-        return {"ok": True, "entries": entries, "last_hash": expected_prev}
-
-    def _recompute_hash(self, record: Dict[str, Any]) -> str:
-        serialized_payload = json.dumps(record.get("payload", {}), sort_keys=True, ensure_ascii=False)
-        base = "%s|%s|%s|%s|%s" % (
-            self.hash_seed,
-            record.get("prev_hash", ""),
-            record.get("ts_utc", ""),
-            record.get("event_type", ""),
-            serialized_payload,
-        )
-        return hashlib.sha256(base.encode("utf-8")).hexdigest()
+        for entries, (prev_hash, entry_hash, recomputed) in enumerate(self._verify_lines(lines), start=1):
+            if prev_hash != expected_prev:
+                return {
+                    "ok": False,
+                    "entries": entries,
+                    "last_hash": expected_prev,
+                    "error": "Broken hash chain at line %s" % entries,
+                }
+            if recomputed != entry_hash:
+                return {
+                    "ok": False,
+                    "entries": entries,
+                    "last_hash": expected_prev,
+                    "error": "Hash mismatch at line %s" % entries,
+                }
+            expected_prev = entry_hash
+
+        return {"ok": True, "entries": len(lines), "last_hash": expected_prev}
+
+    def _verify_lines(self, lines: List[bytes]) -> List[Tuple[Any, Any, str]]:
+        if len(lines) < self.PARALLEL_VERIFY_MIN_ENTRIES:
+            return _verify_batch(self._seed_bytes, lines)
+
+        size = self.PARALLEL_VERIFY_BATCH_SIZE
+        batches = [lines[i : i + size] for i in range(0, len(lines), size)]
+        workers = min(len(batches), os.cpu_count() or 1)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(_verify_batch, repeat(self._seed_bytes), batches)
+                return [item for batch in results for item in batch]
+        except (OSError, BrokenProcessPool, NotImplementedError):
+            # Sandboxes without working multiprocessing verify inline instead.
+            return _verify_batch(self._seed_bytes, lines)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval_seconds):
+            with self._lock:
+                if self._buffer:
+                    self._flush_buffer()
+
+    def _maybe_flush(self) -> None:
+        if len(self._buffer) >= self.flush_max_records:
+            self._flush_buffer()
+        elif time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        # Caller must hold self._lock.
+        if self._buffer:
+            if self._fh is None:
+                self._fh = self.log_path.open("a", encoding="utf-8", buffering=1 << 16)
+            self._fh.write("".join(self._buffer))
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self._buffer = []
+            self._head_dirty = True
+        self._last_flush = time.monotonic()
+        if self._head_dirty and self._last_flush - self._last_head_write >= self.HEAD_WRITE_INTERVAL_SECONDS:
+            self._sync_head()
+
+    def _sync_head(self) -> None:
+        # Caller must hold self._lock, with everything up to _last_hash written.
+        if self._head_dirty and self._fh is not None:
+            self._write_head(self._last_hash, os.fstat(self._fh.fileno()).st_size)
+            self._head_dirty = False
+            self._last_head_write = time.monotonic()
 
     def _load_last_hash(self) -> str:
         if not self.log_path.exists():
             return ""
 
+        # The .head sidecar records the chain tip and the log size it was
+        # taken at; it is only trusted while the log has not grown since.
+        size = self.log_path.stat().st_size
+        head = self._read_head()
+        if head is not None and head.get("size") == size:
+            value = head.get("last_hash")
+            if isinstance(value, str):
+                return value
+
         last_hash = ""
-        with self.log_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                    value = obj.get("entry_hash", "")
-                    if isinstance(value, str):
-                        last_hash = value
-                except Exception:
-                    continue
+        for line in _iter_lines(self.log_path):
+            try:
+                obj = _loads(line)
+                value = obj.get("entry_hash", "")
+                if isinstance(value, str):
+                    last_hash = value
+            except Exception:
+                continue
+        self._write_head(last_hash, size)
         return last_hash
+
+    def _read_head(self) -> Optional[Dict[str, Any]]:
+        try:
+            data = _loads(self._head_path.read_bytes())
+        except Exception:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _write_head(self, last_hash: str, size: int) -> None:
+        tmp_path = self._head_path.with_name(self._head_path.name + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps({"last_hash": last_hash, "size": size}), encoding="utf-8")
+            os.replace(tmp_path, self._head_path)
+        except OSError:
+            # The sidecar is only a startup shortcut; a full scan rebuilds it.
+            pass
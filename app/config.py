@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     gemini_retry_initial_delay_seconds: float = 20.0
     gemini_retry_backoff_multiplier: float = 2.0
     gemini_retry_max_delay_seconds: float = 75.0
+    gemini_rpm_limit: int = 0
     max_context_chars: int = 500000
     max_context_tokens: int = 120000
     context_profile: str = "balanced"
@@ -22,13 +23,18 @@ class Settings(BaseSettings):
     enable_context_cache: bool = True
     context_cache_ttl_minutes: int = 1440
     context_cache_min_chars: int = 120000
-    context_cache_index_path: str = "data/context_cache_index.json"
+    context_cache_index_path: str = "data/context_cache_index.sqlite3"
+    max_upload_mb: int = 100
     enable_pii_redaction: bool = True
     rbac_enabled: bool = False
     rbac_header_name: str = "x-user-role"
     rbac_default_role: str = "viewer"
+    audit_enabled: bool = True
     audit_log_path: str = "data/audit/audit_log.jsonl"
     audit_hash_seed: str = "clinical-protocol-navigator"
+    audit_flush_max_records: int = 32
+    audit_flush_interval_seconds: float = 0.2
+    audit_fsync: bool = False
     openclaw_shared_secret: str = ""
     openclaw_monitored_dir: str = ""
     openclaw_enable_folder_sync: bool = True
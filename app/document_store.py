@@ -1,14 +1,79 @@
 from __future__ import annotations
 
 import hashlib
+import logging
+import multiprocessing
+import os
 import re
+import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import accumulate, repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Set, Tuple
+from typing import AbstractSet, Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
 
 from PyPDF2 import PdfReader
 
 from app.models import Chunk, DocumentInfo
 
+try:
+    import pypdfium2 as pdfium
+
+    HAS_PDFIUM = True
+except Exception:
+    pdfium = None
+    HAS_PDFIUM = False
+
+try:
+    # Linear-time DFA engine; the PII pattern below is kept RE2-compatible.
+    import re2 as _pii_re
+
+    HAS_RE2 = True
+except Exception:
+    _pii_re = re
+    HAS_RE2 = False
+
+logger = logging.getLogger(__name__)
+
+_RE_SECTION = re.compile(r"\n\s*\n")
+_RE_PARABREAK = re.compile(r"\n\s*\n+")
+_RE_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_RE_WS = re.compile(r"\s+")
+# The five patterns are applied one after another, each on the previous
+# pass's output, so overlapping matches in glued text resolve exactly as they
+# always have. Most paragraphs contain no PII at all; one scan with the
+# alternation of all five finds those, and they skip the sequential passes.
+# No lookarounds are used so every pattern compiles under RE2.
+# (pattern, replacement, case-insensitive); flags are inline for RE2.
+_PII_PATTERNS = (
+    (r"\b\d{3}-\d{2}-\d{4}\b", "[REDACTED_SSN]", False),
+    (r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b", "[REDACTED_PHONE]", False),
+    (r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", "[REDACTED_EMAIL]", True),
+    (r"\b(?:MRN|Medical\s*Record\s*Number)\s*[:#]?\s*[A-Z0-9-]{4,}\b", "MRN [REDACTED]", True),
+    (r"\b(?:DOB|Date\s*of\s*Birth)\s*[:#]?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", "DOB [REDACTED]", True),
+)
+_RE_PII_PASSES = [
+    (_pii_re.compile(("(?i)" if ignore_case else "") + pattern), replacement)
+    for pattern, replacement, ignore_case in _PII_PATTERNS
+]
+# SSN and phone are digits only, so matching them case-insensitively here
+# changes nothing.
+_RE_PII_ANY = _pii_re.compile("(?i)" + "|".join("(?:%s)" % pattern for pattern, _, _ in _PII_PATTERNS))
+
+
+SUPPORTED_EXTENSIONS: FrozenSet[str] = frozenset({".pdf", ".txt", ".md"})
+
+# (page, paragraph_start, paragraph_end, text) for one chunk of a document.
+Segment = Tuple[int, int, int, str]
+# (page_count, segments) on success, or None and the error message.
+Extraction = Tuple[Optional[Tuple[int, List[Segment]]], str]
+
+# Extraction workers are started without fork: the server calls in from
+# threadpool threads, and forking a threaded process can copy held locks.
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
 
 class DocumentStore:
     def __init__(self, upload_dir: Path, enable_pii_redaction: bool = True) -> None:
@@ -19,108 +84,201 @@ class DocumentStore:
         self._chunks: List[Chunk] = []
         self._docs: Dict[str, DocumentInfo] = {}
         self._version = 0
+        self._sorted_chunks: List[Chunk] = []
+        self._sorted_version = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Ingests run concurrently (startup background ingest, OpenClaw sync,
+        # uploads, reset), so every change to _chunks/_docs is made under it.
+        self._lock = threading.RLock()
 
     @property
     def version(self) -> int:
         return self._version
 
     def list_documents(self) -> List[DocumentInfo]:
-        return list(self._docs.values())
+        with self._lock:
+            return list(self._docs.values())
 
     def all_chunks(self) -> List[Chunk]:
         return self._chunks
 
-    def ingest_file(self, file_path: Path, source_name: Optional[str] = None) -> DocumentInfo:
-        suffix = file_path.suffix.lower()
-        if suffix == ".pdf":
-            pages = self._extract_pdf_pages(file_path)
-        else:
-            pages = self._extract_text_pages(file_path)
-
-        display_name = source_name or file_path.name
-        doc_id = self._doc_id(display_name)
-        if doc_id in self._docs:
-            self._remove_doc(doc_id)
-
-        doc_chunks: List[Chunk] = []
-        ordinal = 0
-
-        for page_no, page_text in enumerate(pages, start=1):
-            paragraphs = self._split_page_paragraphs(page_text)
-            if not paragraphs:
-                continue
-
-            if self.enable_pii_redaction:
-                paragraphs = [self._redact_pii(p) for p in paragraphs]
-
-            for text, para_start, para_end in self._chunk_paragraphs(paragraphs):
-                chunk = Chunk(
-                    chunk_id="%s:%s" % (doc_id, ordinal),
-                    doc_id=doc_id,
-                    doc_name=display_name,
-                    page=page_no,
-                    paragraph_start=para_start,
-                    paragraph_end=para_end,
-                    ordinal=ordinal,
-                    text=text,
-                )
-                doc_chunks.append(chunk)
-                ordinal += 1
+    def all_chunks_sorted(self) -> List[Chunk]:
+        # Reading order (doc, page, ordinal) only changes on ingest, so the
+        # sorted view is rebuilt per version instead of per query.
+        version = self._version
+        if self._sorted_version != version:
+            self._sorted_chunks = sorted(self._chunks, key=lambda c: (c.doc_name, c.page, c.ordinal))
+            self._sorted_version = version
+        return self._sorted_chunks
 
-        self._chunks.extend(doc_chunks)
-        info = DocumentInfo(doc_id=doc_id, doc_name=display_name, pages=len(pages), chunks=len(doc_chunks))
-        self._docs[doc_id] = info
-        self._version += 1
-        return info
+    def ingest_file(self, file_path: Path, source_name: Optional[str] = None) -> DocumentInfo:
+        page_count, segments = self._extract_segments(file_path, self.enable_pii_redaction)
+        return self._register_document(source_name or file_path.name, page_count, segments)
 
     def load_existing_files(self) -> None:
+        paths: List[Path] = []
         for file_path in sorted(self.upload_dir.iterdir()):
             if not file_path.is_file():
                 continue
-            if file_path.suffix.lower() not in {".pdf", ".txt", ".md"}:
+            if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
                 continue
-            self.ingest_file(file_path, source_name=file_path.name)
+            paths.append(file_path)
+        self._ingest_many(paths)
 
-    def ingest_folder(self, folder_path: Path, allowed_extensions: Optional[Set[str]] = None) -> List[DocumentInfo]:
+    def ingest_folder(
+        self,
+        folder_path: Path,
+        allowed_extensions: Optional[AbstractSet[str]] = None,
+        names: Optional[AbstractSet[str]] = None,
+    ) -> List[DocumentInfo]:
         if not folder_path.exists() or not folder_path.is_dir():
             return []
 
         if allowed_extensions is None:
-            allowed_extensions = {".pdf", ".txt", ".md"}
+            allowed_extensions = SUPPORTED_EXTENSIONS
 
-        infos: List[DocumentInfo] = []
-        for file_path in sorted(folder_path.iterdir()):
+        if names is None:
+            candidates = sorted(folder_path.iterdir())
+        else:
+            # Incremental sync: only the named files, and only plain names so
+            # a caller cannot reach outside the folder.
+            candidates = [folder_path / name for name in sorted(names) if name and Path(name).name == name]
+
+        paths: List[Path] = []
+        for file_path in candidates:
             if not file_path.is_file():
                 continue
             if file_path.suffix.lower() not in allowed_extensions:
                 continue
-            infos.append(self.ingest_file(file_path, source_name=file_path.name))
-        return infos
+            paths.append(file_path)
+        return self._ingest_many(paths)
 
     def clear(self, delete_uploaded_files: bool = True) -> None:
-        self._chunks = []
-        self._docs = {}
+        with self._lock:
+            self._chunks = []
+            self._docs = {}
+            self._version += 1
         if delete_uploaded_files:
             for file_path in sorted(self.upload_dir.iterdir()):
                 if not file_path.is_file():
                     continue
-                if file_path.suffix.lower() not in {".pdf", ".txt", ".md"}:
+                if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
                     continue
                 try:
                     file_path.unlink()
                 except Exception:
                     continue
-        self._version += 1
+
+    def _ingest_many(self, paths: List[Path]) -> List[DocumentInfo]:
+        # One unreadable file must not cost the rest of the batch: every file
+        # that extracts is registered, in order, and failures are logged.
+        infos: List[DocumentInfo] = []
+        for file_path, (extracted, error) in zip(paths, self._extract_many(paths)):
+            if extracted is None:
+                logger.warning("Skipping %s: %s", file_path, error)
+                continue
+            infos.append(self._register_document(file_path.name, *extracted))
+        return infos
+
+    def _extract_many(self, paths: List[Path]) -> List[Extraction]:
+        redact = self.enable_pii_redaction
+        if len(paths) < 2:
+            return [DocumentStore._try_extract_segments(file_path, redact) for file_path in paths]
+
+        # Text extraction is CPU-bound pure Python, so files are extracted in
+        # worker processes; chunk registration stays on the calling thread.
+        try:
+            return list(self._extraction_pool().map(DocumentStore._try_extract_segments, paths, repeat(redact)))
+        except (OSError, BrokenProcessPool, NotImplementedError):
+            with self._pool_lock:
+                self._pool = None
+            return [DocumentStore._try_extract_segments(file_path, redact) for file_path in paths]
+
+    def _extraction_pool(self) -> ProcessPoolExecutor:
+        # Kept for the store's lifetime so worker start-up is paid once.
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context(_POOL_START_METHOD),
+                )
+            return self._pool
+
+    def _register_document(self, display_name: str, page_count: int, segments: List[Segment]) -> DocumentInfo:
+        doc_id = self._doc_id(display_name)
+        doc_chunks: List[Chunk] = []
+        for ordinal, (page_no, para_start, para_end, text) in enumerate(segments):
+            chunk = Chunk(
+                chunk_id="%s:%s" % (doc_id, ordinal),
+                doc_id=doc_id,
+                doc_name=display_name,
+                page=page_no,
+                paragraph_start=para_start,
+                paragraph_end=para_end,
+                ordinal=ordinal,
+                text=text,
+            )
+            doc_chunks.append(chunk)
+
+        info = DocumentInfo(doc_id=doc_id, doc_name=display_name, pages=page_count, chunks=len(doc_chunks))
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove_doc(doc_id)
+            self._chunks.extend(doc_chunks)
+            self._docs[doc_id] = info
+            self._version += 1
+        return info
 
     def _remove_doc(self, doc_id: str) -> None:
-        self._chunks = [c for c in self._chunks if c.doc_id != doc_id]
-        self._docs.pop(doc_id, None)
+        with self._lock:
+            self._chunks = [c for c in self._chunks if c.doc_id != doc_id]
+            self._docs.pop(doc_id, None)
 
-    def _doc_id(self, source_name: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _doc_id(source_name: str) -> str:
         digest = hashlib.sha256(source_name.encode("utf-8")).hexdigest()
         return digest[:12]
 
-    def _extract_pdf_pages(self, file_path: Path) -> List[str]:
+    @staticmethod
+    def _try_extract_segments(file_path: Path, enable_pii_redaction: bool) -> Extraction:
+        try:
+            return DocumentStore._extract_segments(file_path, enable_pii_redaction), ""
+        except Exception as exc:
+            return None, "%s: %s" % (type(exc).__name__, exc)
+
+    @staticmethod
+    def _extract_segments(file_path: Path, enable_pii_redaction: bool) -> Tuple[int, List[Segment]]:
+        # Runs in worker processes, so it only touches its arguments and
+        # returns plain picklable tuples.
+        if file_path.suffix.lower() == ".pdf":
+            pages = DocumentStore._extract_pdf_pages(file_path)
+        else:
+            pages = DocumentStore._extract_text_pages(file_path)
+
+        segments: List[Segment] = []
+        for page_no, page_text in enumerate(pages, start=1):
+            paragraphs = DocumentStore._split_page_paragraphs(page_text)
+            if not paragraphs:
+                continue
+
+            if enable_pii_redaction:
+                paragraphs = [DocumentStore._redact_pii(p) for p in paragraphs]
+
+            for text, para_start, para_end in DocumentStore._chunk_paragraphs(paragraphs):
+                segments.append((page_no, para_start, para_end, text))
+        return len(pages), segments
+
+    @staticmethod
+    def _extract_pdf_pages(file_path: Path) -> List[str]:
+        if HAS_PDFIUM:
+            try:
+                return DocumentStore._extract_pdf_pages_pdfium(file_path)
+            except Exception:
+                # Fall through to the pure-Python reader for files PDFium rejects.
+                pass
+
         reader = PdfReader(str(file_path))
         pages: List[str] = []
         for page in reader.pages:
@@ -128,9 +286,30 @@ class DocumentStore:
             pages.append(text)
         return pages or [""]
 
-    def _extract_text_pages(self, file_path: Path) -> List[str]:
+    @staticmethod
+    def _extract_pdf_pages_pdfium(file_path: Path) -> List[str]:
+        pdf = pdfium.PdfDocument(str(file_path))
+        pages: List[str] = []
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                try:
+                    # PDFium separates lines with CRLF; keep single newlines so
+                    # paragraph splitting sees the same layout as PyPDF2 output.
+                    text = (textpage.get_text_range() or "").replace("\r\n", "\n").strip()
+                finally:
+                    textpage.close()
+                    page.close()
+                pages.append(text)
+        finally:
+            pdf.close()
+        return pages or [""]
+
+    @staticmethod
+    def _extract_text_pages(file_path: Path) -> List[str]:
         raw = file_path.read_text(encoding="utf-8", errors="ignore")
-        sections = re.split(r"\n\s*\n", raw)
+        sections = _RE_SECTION.split(raw)
         pages: List[str] = []
         current: List[str] = []
         char_count = 0
@@ -147,12 +326,13 @@ class DocumentStore:
             pages.append("\n\n".join(current))
         return pages or [raw]
 
-    def _split_page_paragraphs(self, page_text: str) -> List[str]:
+    @staticmethod
+    def _split_page_paragraphs(page_text: str) -> List[str]:
         if not page_text:
             return []
 
         raw = page_text.replace("\r", "\n")
-        blocks = [x.strip() for x in re.split(r"\n\s*\n+", raw) if x.strip()]
+        blocks = [x.strip() for x in _RE_PARABREAK.split(raw) if x.strip()]
 
         if len(blocks) <= 1:
             lines = [x.strip() for x in raw.splitlines() if x.strip()]
@@ -170,69 +350,82 @@ class DocumentStore:
                 stitched.append(" ".join(bucket))
             blocks = stitched
 
-        normalized = [self._normalize_spaces(x) for x in blocks]
+        normalized = [DocumentStore._normalize_spaces(x) for x in blocks]
         return [x for x in normalized if x]
 
+    @staticmethod
     def _chunk_paragraphs(
-        self,
         paragraphs: Sequence[str],
         chunk_size: int = 1400,
     ) -> List[Tuple[str, int, int]]:
         chunks: List[Tuple[str, int, int]] = []
-
-        buffer: List[str] = []
-        buffer_start = 0
-        buffer_end = 0
-        current_len = 0
-
-        def flush() -> None:
-            nonlocal buffer, buffer_start, buffer_end, current_len
-            if not buffer:
-                return
-            chunks.append(("\n\n".join(buffer), buffer_start, buffer_end))
-            buffer = []
-            buffer_start = 0
-            buffer_end = 0
-            current_len = 0
-
-        for idx, paragraph in enumerate(paragraphs, start=1):
-            if not paragraph:
-                continue
-
-            if len(paragraph) > int(chunk_size * 1.3):
-                flush()
-                for piece in self._split_long_paragraph(paragraph, chunk_size):
+        oversize = int(chunk_size * 1.3)
+        indexed = [(idx, paragraph) for idx, paragraph in enumerate(paragraphs, start=1) if paragraph]
+
+        # Oversized paragraphs are split on their own and break the greedy
+        # packing into independent runs.
+        start = 0
+        while start < len(indexed):
+            end = start
+            while end < len(indexed) and len(indexed[end][1]) <= oversize:
+                end += 1
+            DocumentStore._pack_paragraphs(indexed[start:end], chunk_size, chunks)
+            if end < len(indexed):
+                idx, paragraph = indexed[end]
+                for piece in DocumentStore._split_long_paragraph(paragraph, chunk_size):
                     chunks.append((piece, idx, idx))
-                continue
-
-            additional = len(paragraph) + (2 if buffer else 0)
-            if buffer and current_len + additional > chunk_size:
-                flush()
+            start = end + 1
 
-            if not buffer:
-                buffer_start = idx
-            buffer.append(paragraph)
-            buffer_end = idx
-            current_len += additional
-
-        flush()
         return chunks
 
-    def _split_long_paragraph(self, paragraph: str, chunk_size: int) -> List[str]:
-        sentence_parts = re.split(r"(?<=[.!?])\s+", paragraph)
+    @staticmethod
+    def _pack_paragraphs(
+        run: Sequence[Tuple[int, str]],
+        chunk_size: int,
+        chunks: List[Tuple[str, int, int]],
+    ) -> None:
+        # offsets[j] is the joined length of run[:j] with every paragraph
+        # counted as len + 2, so each chunk's end is one bisect away.
+        offsets = [0]
+        offsets.extend(accumulate(len(paragraph) + 2 for _, paragraph in run))
+
+        start = 0
+        # The first chunk of a run is measured without the leading separator;
+        # chunks opened by an overflow carry it, as in the original packer.
+        slack = 2
+        while start < len(run):
+            limit = offsets[start] + chunk_size + slack
+            end = max(start + 1, bisect_right(offsets, limit, start + 1) - 1)
+            chunks.append(
+                (
+                    "\n\n".join(paragraph for _, paragraph in run[start:end]),
+                    run[start][0],
+                    run[end - 1][0],
+                )
+            )
+            start = end
+            slack = 0
+
+    @staticmethod
+    def _split_long_paragraph(paragraph: str, chunk_size: int) -> List[str]:
+        # Paragraphs arrive whitespace-normalised, so sentences carry no edge
+        # whitespace and the running length can be tracked instead of
+        # re-concatenating (and re-stripping) the buffer per sentence.
         pieces: List[str] = []
-        current = ""
+        current: List[str] = []
+        current_len = -1
 
-        for sentence in sentence_parts:
-            candidate = (current + " " + sentence).strip() if current else sentence
-            if current and len(candidate) > chunk_size:
-                pieces.append(current.strip())
-                current = sentence
+        for sentence in _RE_SENTENCE.split(paragraph):
+            if current and current_len + 1 + len(sentence) > chunk_size:
+                pieces.append(" ".join(current))
+                current = [sentence]
+                current_len = len(sentence)
             else:
-                current = candidate
+                current.append(sentence)
+                current_len += 1 + len(sentence)
 
         if current:
-            pieces.append(current.strip())
+            pieces.append(" ".join(current))
 
         final_pieces: List[str] = []
         for piece in pieces:
@@ -249,33 +442,16 @@ class DocumentStore:
 
         return [x for x in final_pieces if x]
 
-    def _normalize_spaces(self, text: str) -> str:
-        return re.sub(r"\s+", " ", text).strip()
-
-    def _redact_pii(self, text: str) -> str:
-        redacted = text
-        redacted = re.sub(r"\b\d{3}-\d{2}-\d{4}\b", "[REDACTED_SSN]", redacted)
-        redacted = re.sub(
-            r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b",
-            "[REDACTED_PHONE]",
-            redacted,
-        )
-        redacted = re.sub(
-            r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b",
-            "[REDACTED_EMAIL]",
-            redacted,
-            flags=re.IGNORECASE,
-        )
-        redacted = re.sub(
-            r"\b(?:MRN|Medical\s*Record\s*Number)\s*[:#]?\s*[A-Z0-9-]{4,}\b",
-            "MRN [REDACTED]",
-            redacted,
-            flags=re.IGNORECASE,
-        )
-        redacted = re.sub(
-            r"\b(?:DOB|Date\s*of\s*Birth)\s*[:#]?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b",
-            "DOB [REDACTED]",
-            redacted,
-            flags=re.IGNORECASE,
-        )
-        return redacted
+    @staticmethod
+    def _normalize_spaces(text: str) -> str:
+        return _RE_WS.sub(" ", text).strip()
+
+    @staticmethod
+    def _redact_pii(text: str) -> str:
+        # Without any match the passes cannot change the text, so a miss here
+        # is exactly the sequential result.
+        if _RE_PII_ANY.search(text) is None:
+            return text
+        for pattern, replacement in _RE_PII_PASSES:
+            text = pattern.sub(replacement, text)
+        return text
@@ -1,10 +1,30 @@
 from __future__ import annotations
 
 import re
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
 
+import numpy as np
+
+from app.document_store import DocumentStore
+from app.llm_client import LLMClient
 from app.models import Chunk, Citation
 
+_RE_WS = re.compile(r"\s+")
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> List[int]:
+    """Indices of the top_k highest scores, best first, without sorting all of them."""
+    scores = np.asarray(scores)
+    k = min(max(0, top_k), len(scores))
+    if k == 0:
+        return []
+    if k < len(scores):
+        idx = np.sort(np.argpartition(scores, -k)[-k:])
+    else:
+        idx = np.arange(len(scores))
+    # Stable sort over position-ordered survivors keeps ties in corpus order.
+    return idx[np.argsort(-scores[idx], kind="stable")].tolist()
+
 
 def format_chunk(chunk: Chunk) -> str:
     return (
@@ -13,6 +33,35 @@ def format_chunk(chunk: Chunk) -> str:
     )
 
 
+class BlockCache:
+    """format_chunk output and its fast token estimate, memoized per store version."""
+
+    def __init__(self, store: DocumentStore, llm: LLMClient) -> None:
+        self.store = store
+        self.llm = llm
+        self._version = -1
+        self._blocks: Dict[str, Tuple[Chunk, str, int]] = {}
+
+    def get(self, chunk: Chunk) -> Tuple[str, int]:
+        # The version reset only bounds memory. chunk_ids are reused when a
+        # document is re-ingested, and a query may still hold pre-ingest
+        # chunks after the version moves, so an entry is served only to
+        # the exact Chunk object it was built from.
+        version = self.store.version
+        if version != self._version:
+            self._blocks = {}
+            self._version = version
+        entry = self._blocks.get(chunk.chunk_id)
+        if entry is None or entry[0] is not chunk:
+            block = format_chunk(chunk)
+            entry = (chunk, block, self.llm.estimate_tokens(block, fast=True))
+            self._blocks[chunk.chunk_id] = entry
+        return entry[1], entry[2]
+
+    def block(self, chunk: Chunk) -> str:
+        return self.get(chunk)[0]
+
+
 def build_citations(chunks: List[Chunk], max_items: int = 5) -> List[Citation]:
     citations: List[Citation] = []
     seen: Set[Tuple[str, int, int, int]] = set()
@@ -22,7 +71,7 @@ def build_citations(chunks: List[Chunk], max_items: int = 5) -> List[Citation]:
         if key in seen:
             continue
         seen.add(key)
-        snippet = re.sub(r"\s+", " ", chunk.text)[:220]
+        snippet = _RE_WS.sub(" ", chunk.text)[:220]
         citations.append(
             Citation(
                 doc_name=chunk.doc_name,
@@ -3,13 +3,17 @@ from __future__ import annotations
 from typing import Dict, List, Tuple
 from time import perf_counter
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
 
 from app.document_store import DocumentStore
-from app.engines.common import build_citations, fallback_answer, format_chunk
+from app.engines.common import BlockCache, build_citations, fallback_answer, top_k_indices
 from app.llm_client import LLMClient
 from app.models import AskResponse, Chunk
+from app.tfidf_index import TfidfIndex
+
+# Stateless, so one instance serves every call without a vocabulary fit.
+_HV = HashingVectorizer(n_features=2**18, alternate_sign=False, norm="l2", dtype=np.float32)
 
 
 class LongContextEngine:
@@ -21,17 +25,20 @@ class LongContextEngine:
         self,
         store: DocumentStore,
         llm: LLMClient,
+        index: TfidfIndex,
         max_context_chars: int,
         max_context_tokens: int,
     ) -> None:
         self.store = store
         self.llm = llm
+        self.index = index
+        self.blocks = BlockCache(store, llm)
         self.max_context_chars = max_context_chars
         self.max_context_tokens = max_context_tokens
 
     def ask(self, question: str, top_k: int) -> AskResponse:
         start = perf_counter()
-        chunks = sorted(self.store.all_chunks(), key=lambda c: (c.doc_name, c.page, c.ordinal))
+        chunks = self.store.all_chunks_sorted()
 
         if not chunks:
             return AskResponse(
@@ -44,20 +51,17 @@ class LongContextEngine:
                 context_tokens=0,
             )
 
-        selected, running_tokens = self._assemble_context(question, chunks)
-        if not selected:
-            selected = self._rank_relevant(question, chunks, max(1, top_k))
-            running_tokens = self.llm.estimate_tokens("\n\n".join([format_chunk(c) for c in selected]), fast=True)
-
-        context = "\n\n".join([format_chunk(c) for c in selected])
+        scores = self._score_chunks(question)
+        selected, running_tokens = self._select_context(question, chunks, top_k, scores)
+        context = "\n\n".join([self.blocks.block(c) for c in selected])
 
         answer = self.llm.answer("LONG_CONTEXT", question, context, use_cache=True)
         if "LLM is not configured" in answer or "Fallback mode" in answer:
-            relevant = self._rank_relevant(question, selected, top_k)
+            relevant = self._rank_relevant(question, selected, top_k, scores)
             answer = "LLM fallback: %s\n\n%s" % (answer, fallback_answer(question, relevant))
             citation_source = relevant
         else:
-            citation_source = self._rank_relevant(question, selected, top_k)
+            citation_source = self._rank_relevant(question, selected, top_k, scores)
 
         response = AskResponse(
             mode="long_context",
@@ -70,16 +74,61 @@ class LongContextEngine:
         )
         return response
 
-    def _assemble_context(self, question: str, chunks: List[Chunk]) -> Tuple[List[Chunk], int]:
-        scores = self._score_chunks(question, chunks)
+    def ask_batch(self, questions: List[str], top_k: int) -> List[AskResponse]:
+        start = perf_counter()
+        chunks = self.store.all_chunks_sorted()
+        if not chunks:
+            return [self.ask(question, top_k) for question in questions]
+
+        # The shared context is assembled for all questions at once; each
+        # answer is then cited from that context by its own question's scores.
+        combined = "\n".join(questions)
+        selected, running_tokens = self._select_context(combined, chunks, top_k, self._score_chunks(combined))
+        context = "\n\n".join([self.blocks.block(c) for c in selected])
+
+        answers = self.llm.answer_batch("LONG_CONTEXT", questions, context, use_cache=True)
+        latency_ms = int((perf_counter() - start) * 1000)
+
+        responses: List[AskResponse] = []
+        for question, answer in zip(questions, answers):
+            relevant = self._rank_relevant(question, selected, top_k, self._score_chunks(question))
+            if "LLM is not configured" in answer or "Fallback mode" in answer:
+                answer = "LLM fallback: %s\n\n%s" % (answer, fallback_answer(question, relevant))
+            responses.append(
+                AskResponse(
+                    mode="long_context",
+                    answer=answer,
+                    citations=build_citations(relevant),
+                    latency_ms=latency_ms,
+                    context_chunks=len(selected),
+                    context_chars=len(context),
+                    context_tokens=running_tokens,
+                )
+            )
+        return responses
 
+    def _select_context(
+        self,
+        question: str,
+        chunks: List[Chunk],
+        top_k: int,
+        scores: Dict[str, float],
+    ) -> Tuple[List[Chunk], int]:
+        selected, running_tokens = self._assemble_context(chunks, scores)
+        if not selected:
+            selected = self._rank_relevant(question, chunks, max(1, top_k), scores)
+            running_tokens = self.llm.estimate_tokens_batch([self.blocks.block(c) for c in selected], "\n\n")
+        return selected, running_tokens
+
+    def _assemble_context(self, chunks: List[Chunk], scores: Dict[str, float]) -> Tuple[List[Chunk], int]:
         doc_to_chunks: Dict[str, List[Chunk]] = {}
         for chunk in chunks:
             if chunk.doc_name not in doc_to_chunks:
                 doc_to_chunks[chunk.doc_name] = []
             doc_to_chunks[chunk.doc_name].append(chunk)
 
-        ranked_docs = self._rank_documents(chunks, scores)[: self.MAX_DOCS_FOR_CONTEXT]
+        chunk_scores = [scores.get(c.chunk_id, 0.0) for c in chunks]
+        ranked_docs = self._rank_documents(chunks, chunk_scores)[: self.MAX_DOCS_FOR_CONTEXT]
 
         selected: List[Chunk] = []
         running_chars = 0
@@ -94,8 +143,7 @@ class LongContextEngine:
                 return False, False
 
             chunk = chunk_list[index]
-            block = format_chunk(chunk)
-            block_tokens = self.llm.estimate_tokens(block, fast=True)
+            block, block_tokens = self.blocks.get(chunk)
 
             if running_chars + len(block) > self.max_context_chars:
                 return False, True
@@ -130,18 +178,13 @@ class LongContextEngine:
 
         return selected, running_tokens
 
-    def _score_chunks(self, question: str, chunks: List[Chunk]) -> List[float]:
-        try:
-            vectorizer = TfidfVectorizer(stop_words="english")
-            matrix = vectorizer.fit_transform([question] + [c.text for c in chunks])
-        except ValueError:
-            vectorizer = TfidfVectorizer()
-            matrix = vectorizer.fit_transform([question] + [c.text for c in chunks])
-
-        qv = matrix[0]
-        dv = matrix[1:]
-        raw = cosine_similarity(qv, dv)[0]
-        return [float(x) for x in raw]
+    def _score_chunks(self, question: str) -> Dict[str, float]:
+        # Scored once per question and reused for document ranking and for
+        # reranking the selected context. Chunks ingested after the snapshot
+        # was taken are absent until the next rebuild.
+        snapshot = self.index.get(self.store)
+        raw = snapshot.scores(question)
+        return dict(zip([c.chunk_id for c in snapshot.chunks], raw.tolist()))
 
     def _rank_documents(self, chunks: List[Chunk], scores: List[float]) -> List[str]:
         grouped: Dict[str, List[float]] = {}
@@ -174,20 +217,24 @@ class LongContextEngine:
 
         return doc_order
 
-    def _rank_relevant(self, question: str, chunks: List[Chunk], top_k: int) -> List[Chunk]:
+    def _rank_relevant(
+        self,
+        question: str,
+        chunks: List[Chunk],
+        top_k: int,
+        scores: Dict[str, float],
+    ) -> List[Chunk]:
         if not chunks:
             return []
         if len(chunks) <= top_k:
             return chunks
 
-        try:
-            vectorizer = TfidfVectorizer(stop_words="english")
-            matrix = vectorizer.fit_transform([question] + [c.text for c in chunks])
-        except ValueError:
-            vectorizer = TfidfVectorizer()
-            matrix = vectorizer.fit_transform([question] + [c.text for c in chunks])
-        qv = matrix[0]
-        dv = matrix[1:]
-        scores = cosine_similarity(qv, dv)[0]
-        ranked = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
-        return [chunks[i] for i, _ in ranked[:top_k]]
+        known = [scores.get(c.chunk_id) for c in chunks]
+        if None not in known:
+            ranking = np.asarray(known)
+        else:
+            # Chunks outside the shared index (e.g. ingested mid-query) are
+            # compared on hashed term counts instead of refitting a vocabulary.
+            matrix = _HV.transform([question] + [c.text for c in chunks])
+            ranking = (matrix[1:] @ matrix[0].T).toarray().ravel()
+        return [chunks[i] for i in top_k_indices(ranking, top_k)]
@@ -1,35 +1,25 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
 from time import perf_counter
-from typing import Any, List, Optional
-
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List
 
 from app.document_store import DocumentStore
-from app.engines.common import build_citations, fallback_answer, format_chunk
+from app.engines.common import BlockCache, build_citations, fallback_answer, top_k_indices
 from app.llm_client import LLMClient
 from app.models import AskResponse, Chunk
-
-
-@dataclass
-class _IndexCache:
-    version: int = -1
-    vectorizer: Optional[TfidfVectorizer] = None
-    matrix: Optional[Any] = None
+from app.tfidf_index import IndexSnapshot, TfidfIndex
 
 
 class RAGEngine:
-    def __init__(self, store: DocumentStore, llm: LLMClient) -> None:
+    def __init__(self, store: DocumentStore, llm: LLMClient, index: TfidfIndex) -> None:
         self.store = store
         self.llm = llm
-        self.cache = _IndexCache()
+        self.index = index
+        self.blocks = BlockCache(store, llm)
 
     def ask(self, question: str, top_k: int) -> AskResponse:
         start = perf_counter()
-        chunks = self.store.all_chunks()
-        if not chunks:
+        if not self.store.all_chunks():
             return AskResponse(
                 mode="rag",
                 answer="No documents are loaded.",
@@ -40,15 +30,9 @@ class RAGEngine:
                 context_tokens=0,
             )
 
-        self._ensure_index(chunks)
-        query_vector = self.cache.vectorizer.transform([question])
-        scores = cosine_similarity(query_vector, self.cache.matrix)[0]
-        ranked = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
-        selected = [chunks[idx] for idx, score in ranked[:top_k] if score > 0]
-        if not selected:
-            selected = [chunks[idx] for idx, _ in ranked[:top_k]]
+        selected = self._retrieve(self.index.get(self.store), question, top_k)
 
-        context_blocks = [format_chunk(c) for c in selected]
+        context_blocks = [self.blocks.block(c) for c in selected]
         context = "\n\n".join(context_blocks)
         context_tokens = self.llm.estimate_tokens(context, fast=True)
 
@@ -67,19 +51,43 @@ class RAGEngine:
         )
         return response
 
-    def _ensure_index(self, chunks: List[Chunk]) -> None:
-        if self.cache.version == self.store.version and self.cache.matrix is not None:
-            return
+    def ask_batch(self, questions: List[str], top_k: int) -> List[AskResponse]:
+        start = perf_counter()
+        if not self.store.all_chunks():
+            return [self.ask(question, top_k) for question in questions]
+
+        snapshot = self.index.get(self.store)
+        per_question = [self._retrieve(snapshot, question, top_k) for question in questions]
+        # One prompt carries the union of every question's retrieved chunks.
+        union = list({c.chunk_id: c for selected in per_question for c in selected}.values())
+        context = "\n\n".join([self.blocks.block(c) for c in union])
+        context_tokens = self.llm.estimate_tokens(context, fast=True)
 
-        texts = [c.text for c in chunks]
-        try:
-            vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words="english")
-            matrix = vectorizer.fit_transform(texts)
-        except ValueError:
-            # Handles corpora that reduce to stop words only.
-            vectorizer = TfidfVectorizer(ngram_range=(1, 2))
-            matrix = vectorizer.fit_transform(texts)
+        answers = self.llm.answer_batch("RAG", questions, context)
+        latency_ms = int((perf_counter() - start) * 1000)
 
-        self.cache.version = self.store.version
-        self.cache.vectorizer = vectorizer
-        self.cache.matrix = matrix
+        responses: List[AskResponse] = []
+        for question, selected, answer in zip(questions, per_question, answers):
+            if "LLM is not configured" in answer or "Fallback mode" in answer:
+                answer = "LLM fallback: %s\n\n%s" % (answer, fallback_answer(question, selected))
+            responses.append(
+                AskResponse(
+                    mode="rag",
+                    answer=answer,
+                    citations=build_citations(selected),
+                    latency_ms=latency_ms,
+                    context_chunks=len(union),
+                    context_chars=len(context),
+                    context_tokens=context_tokens,
+                )
+            )
+        return responses
+
+    def _retrieve(self, snapshot: IndexSnapshot, question: str, top_k: int) -> List[Chunk]:
+        chunks = snapshot.chunks
+        scores = snapshot.scores(question)
+        ranked = top_k_indices(scores, top_k)
+        selected = [chunks[idx] for idx in ranked if scores[idx] > 0]
+        if not selected:
+            selected = [chunks[idx] for idx in ranked]
+        return selected
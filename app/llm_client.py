@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import atexit
 import hashlib
+import inspect
 import json
+import random
+import re
+import sqlite3
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from app.config import Settings
 
@@ -18,13 +26,52 @@ except Exception:
     types = None
     HAS_GENAI = False
 
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except Exception:
+    requests = None
+    HTTPAdapter = None
+
+_RE_RETRYABLE = re.compile(
+    r"429|resource_exhausted|rate[- ]limit|quota|too many requests|temporarily unavailable|deadline exceeded",
+    re.IGNORECASE,
+)
+_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504, 529})
+
+# Start of each answer in a batched response, e.g. "[[ANSWER 2]]". Plain "2."
+# numbering is avoided because answers contain numbered lists of their own.
+_RE_BATCH_ANSWER = re.compile(r"^\s*\[\[ANSWER (\d+)\]\]\s*", re.MULTILINE | re.IGNORECASE)
+
+# Errors meaning a bound cached_content no longer exists on the server.
+_RE_CACHE_MISSING = re.compile(r"\b404\b|not[_ ]found|expired", re.IGNORECASE)
+
+# Server hints such as "Please retry in 27.5s" or "'retryDelay': '27s'".
+_RE_RETRY_AFTER = re.compile(r"retry(?:[_ -]?(?:after|delay|in))?\W{0,4}(\d+(?:\.\d+)?)\s*s\b", re.IGNORECASE)
+
 
 class LLMClient:
+    CACHE_INDEX_MEMORY_ENTRIES = 1024
+    CONTEXT_HASH_SLICE_CHARS = 1 << 20
+    TOKEN_COUNT_CACHE_ENTRIES = 256
+    HTTP_POOL_SIZE = 32
+
     def __init__(self, settings: Settings) -> None:
         self._settings = settings
         self._client = None
         self._cache_index_path = Path(self._settings.context_cache_index_path)
-        self._cache_index: Dict[str, Dict[str, Any]] = {}
+        # SQLite holds the durable index; the OrderedDict is a bounded LRU in
+        # front of it so repeat questions never touch the database.
+        self._cache_db: Optional[sqlite3.Connection] = None
+        self._cache_lock = threading.Lock()
+        self._cache_index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._context_hash_memo: Optional[Tuple[str, str, str]] = None
+        self._token_counts: Dict[Tuple[int, int], int] = {}
+        # Send times of recent Gemini calls for the client-side RPM window.
+        self._sent_at: "deque[float]" = deque()
+        self._rate_lock = threading.Lock()
 
         if HAS_GENAI and self._settings.gemini_api_key:
             try:
@@ -32,6 +79,8 @@ class LLMClient:
             except Exception:
                 self._client = None
 
+        self._http_session = self._install_http_session()
+        self._cache_style = self._probe_cache_style()
         self._load_cache_index()
 
     def estimate_tokens(self, text: str, fast: bool = True) -> int:
@@ -39,6 +88,12 @@ class LLMClient:
         if fast or not self._client:
             return estimate
 
+        # Only API counts are cached; the fast estimate is cheaper than a lookup.
+        key = (hash(text), len(text))
+        cached = self._token_counts.get(key)
+        if cached is not None:
+            return cached
+
         try:
             response = self._client.models.count_tokens(
                 model=self._settings.gemini_model,
@@ -48,12 +103,23 @@ class LLMClient:
             if total is None and isinstance(response, dict):
                 total = response.get("total_tokens")
             if isinstance(total, int) and total > 0:
+                if len(self._token_counts) >= self.TOKEN_COUNT_CACHE_ENTRIES:
+                    # FIFO eviction: dicts iterate in insertion order.
+                    self._token_counts.pop(next(iter(self._token_counts)), None)
+                self._token_counts[key] = total
                 return total
         except Exception:
             return estimate
 
         return estimate
 
+    def estimate_tokens_batch(self, texts: List[str], separator: str = "") -> int:
+        # Fast estimate of separator.join(texts) without building the string.
+        if not texts:
+            return 1
+        total_chars = sum(len(t) for t in texts) + len(separator) * (len(texts) - 1)
+        return max(1, total_chars // 4)
+
     def answer(self, mode_name: str, question: str, context: str, use_cache: bool = True) -> str:
         if not self._settings.gemini_api_key:
             return (
@@ -67,6 +133,58 @@ class LLMClient:
                 "Fallback mode is active."
             )
 
+        # Identical concurrent questions over the same context share one
+        # upstream call; followers wait on the leader's result.
+        key_source = "%s|%s|%s|%s" % (mode_name, question, self._context_hash(context), use_cache)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._generate_answer(mode_name, question, context, use_cache)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def answer_batch(self, mode_name: str, questions: List[str], context: str, use_cache: bool = True) -> List[str]:
+        if len(questions) == 1:
+            return [self.answer(mode_name, questions[0], context, use_cache=use_cache)]
+
+        numbered = "\n".join("%s. %s" % (i, q) for i, q in enumerate(questions, start=1))
+        batch_question = (
+            "Answer each numbered question independently. Start each answer on its own line with "
+            "[[ANSWER n]], where n is the question number.\n" + numbered
+        )
+        text = self.answer(mode_name, batch_question, context, use_cache=use_cache)
+        return self._split_batch_answer(text, len(questions))
+
+    def _split_batch_answer(self, text: str, count: int) -> List[str]:
+        parts: Dict[int, str] = {}
+        matches = list(_RE_BATCH_ANSWER.finditer(text))
+        for i, match in enumerate(matches):
+            number = int(match.group(1))
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            if 1 <= number <= count and number not in parts:
+                parts[number] = text[match.end() : end].strip()
+        if not parts:
+            # Fallback messages and unmarked replies apply to every question.
+            return [text] * count
+        # A skipped marker must not hand that question the other answers.
+        return [parts.get(n) or "No answer was returned for this question." for n in range(1, count + 1)]
+
+    def _generate_answer(self, mode_name: str, question: str, context: str, use_cache: bool) -> str:
         system_instruction = (
             "You are a Clinical Policy Verification Engine. "
             "Identify conflicts, gaps, and compliance risks using only provided context. "
@@ -78,26 +196,27 @@ class LLMClient:
         if use_cache and self._should_use_cache(mode_name, context):
             cached_content_name = self._ensure_cached_content(context, mode_name)
 
-        if cached_content_name:
-            prompt_text = (
-                f"QUESTION:\n{question}\n\n"
-                "Return: (1) finding summary, (2) conflict risk, (3) remediation pointers."
-            )
-        else:
-            prompt_text = (
-                f"MODE: {mode_name}\n"
-                f"QUESTION:\n{question}\n\n"
-                "DOCUMENT CONTEXT:\n"
-                f"{context}\n\n"
-                "Return: (1) finding summary, (2) conflict risk, (3) remediation pointers."
-            )
-
         try:
-            response = self._generate_content(
-                prompt_text=prompt_text,
-                system_instruction=system_instruction,
-                cached_content_name=cached_content_name,
-            )
+            if not cached_content_name:
+                prompt_text = self._inline_prompt(mode_name, question, context)
+                response = self._generate_content(prompt_text, system_instruction, None)
+            else:
+                cached_prompt = (
+                    f"QUESTION:\n{question}\n\n"
+                    "Return: (1) finding summary, (2) conflict risk, (3) remediation pointers."
+                )
+                try:
+                    response = self._generate_content(cached_prompt, system_instruction, cached_content_name)
+                except Exception as exc:
+                    # A cache can disappear server-side before its recorded
+                    # expiry; forget it and answer with the context inline.
+                    # Anything else already went through the retry loop, and
+                    # resending the full context would only repeat it.
+                    if not _RE_CACHE_MISSING.search(str(exc)):
+                        raise
+                    self._cache_forget(self._context_hash(context))
+                    prompt_text = self._inline_prompt(mode_name, question, context)
+                    response = self._generate_content(prompt_text, system_instruction, None)
             text = (getattr(response, "text", None) or "").strip()
             if text:
                 return text
@@ -108,8 +227,20 @@ class LLMClient:
                 message = message[:240] + "..."
             return "Gemini request failed (%s): %s. Fallback mode is active." % (type(exc).__name__, message)
 
+    def _inline_prompt(self, mode_name: str, question: str, context: str) -> str:
+        # Context leads and the question trails so repeat questions over the
+        # same corpus share the longest possible prefix, which is what
+        # Gemini's implicit caching matches on.
+        return (
+            "DOCUMENT CONTEXT:\n"
+            f"{context}\n\n"
+            f"MODE: {mode_name}\n"
+            f"QUESTION:\n{question}\n\n"
+            "Return: (1) finding summary, (2) conflict risk, (3) remediation pointers."
+        )
+
     def _should_use_cache(self, mode_name: str, context: str) -> bool:
-        if not self._settings.enable_context_cache:
+        if not self._settings.enable_context_cache or self._cache_style == "none":
             return False
         if not mode_name.lower().startswith("long"):
             return False
@@ -122,65 +253,89 @@ class LLMClient:
         cached_content_name: Optional[str],
     ) -> Any:
         model = self._settings.gemini_model
-
-        if not cached_content_name:
-            config = types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.0,
-                max_output_tokens=1200,
-            )
-            return self._call_with_backoff(
-                lambda: self._client.models.generate_content(
-                    model=model,
-                    contents=prompt_text,
-                    config=config,
-                )
-            )
-
-        # Try cache binding styles for SDK/API compatibility.
-        attempts = [
-            lambda: self._client.models.generate_content(
-                model=model,
-                contents=prompt_text,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=0.0,
-                    max_output_tokens=1200,
-                    cached_content=cached_content_name,
-                ),
-            ),
-            lambda: self._client.models.generate_content(
-                model=model,
-                contents=prompt_text,
-                cached_content=cached_content_name,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=0.0,
-                    max_output_tokens=1200,
-                ),
-            ),
+        config_kwargs: Dict[str, Any] = {
+            "system_instruction": system_instruction,
+            "temperature": 0.0,
+            "max_output_tokens": 1200,
+        }
+        call_kwargs: Dict[str, Any] = {}
+        if cached_content_name:
+            # _should_use_cache only lets a cache through when a binding
+            # style was detected at startup.
+            if self._cache_style == "config":
+                config_kwargs["cached_content"] = cached_content_name
+            else:
+                call_kwargs["cached_content"] = cached_content_name
+
+        config = types.GenerateContentConfig(**config_kwargs)
+        return self._call_with_backoff(
             lambda: self._client.models.generate_content(
                 model=model,
                 contents=prompt_text,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=0.0,
-                    max_output_tokens=1200,
-                ),
-            ),
-        ]
-
-        last_error = None
-        for attempt in attempts:
-            try:
-                return self._call_with_backoff(attempt)
-            except Exception as exc:
-                last_error = exc
-        raise last_error
+                config=config,
+                **call_kwargs,
+            )
+        )
+
+    def _install_http_session(self) -> Optional[Any]:
+        # google-genai 1.2 opens a fresh requests.Session, and so a fresh TLS
+        # handshake, for every API-key call and exposes no transport option.
+        # Route those calls through one pooled session instead. SDKs that
+        # already keep a persistent httpx client are left untouched.
+        api_client = getattr(self._client, "_api_client", None)
+        if requests is None or api_client is None:
+            return None
+        if hasattr(api_client, "_httpx_client") or not hasattr(api_client, "_request_unauthorized"):
+            return None
+        try:
+            from google.genai import errors as genai_errors
+            from google.genai._api_client import HttpResponse
+        except Exception:
+            return None
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        def request_unauthorized(http_request: Any, stream: bool = False) -> Any:
+            data = http_request.data
+            if data and not isinstance(data, bytes):
+                data = json.dumps(data)
+            response = session.request(
+                method=http_request.method,
+                url=http_request.url,
+                headers=http_request.headers,
+                data=data or None,
+                timeout=http_request.timeout,
+                stream=stream,
+            )
+            genai_errors.APIError.raise_for_response(response)
+            return HttpResponse(response.headers, response if stream else [response.text])
+
+        api_client._request_unauthorized = request_unauthorized
+        atexit.register(session.close)
+        return session
+
+    def _probe_cache_style(self) -> str:
+        # SDK versions differ in where cached_content is accepted; detect it
+        # once instead of trying each binding on every request.
+        if not self._client or types is None:
+            return "none"
+        fields = getattr(types.GenerateContentConfig, "model_fields", None) or {}
+        if "cached_content" in fields:
+            return "config"
+        try:
+            parameters = inspect.signature(self._client.models.generate_content).parameters
+        except (AttributeError, TypeError, ValueError):
+            return "none"
+        if "cached_content" in parameters:
+            return "kwarg"
+        return "none"
 
     def _ensure_cached_content(self, context: str, mode_name: str) -> Optional[str]:
         context_hash = self._context_hash(context)
-        cached = self._cache_index.get(context_hash)
+        cached = self._cache_lookup(context_hash)
 
         if cached and self._cache_entry_valid(cached):
             return cached.get("name")
@@ -190,13 +345,15 @@ class LLMClient:
             return None
 
         expires_at = int(time.time()) + (self._settings.context_cache_ttl_minutes * 60)
-        self._cache_index[context_hash] = {
-            "name": created_name,
-            "expires_at": expires_at,
-            "mode": mode_name,
-            "model": self._settings.gemini_model,
-        }
-        self._save_cache_index()
+        self._cache_store(
+            context_hash,
+            {
+                "name": created_name,
+                "expires_at": expires_at,
+                "mode": mode_name,
+                "model": self._settings.gemini_model,
+            },
+        )
         return created_name
 
     def _create_cached_content(self, context: str, mode_name: str, context_hash: str) -> Optional[str]:
@@ -257,13 +414,19 @@ class LLMClient:
         max_delay = max(delay, self._settings.gemini_retry_max_delay_seconds)
 
         for attempt in range(1, max_attempts + 1):
+            self._wait_for_rate_slot()
             try:
                 return fn()
             except Exception as exc:
                 if attempt >= max_attempts or not self._is_retryable(exc):
                     raise
-                if delay > 0:
-                    time.sleep(delay)
+                retry_after = self._retry_after_seconds(exc)
+                if retry_after is not None:
+                    time.sleep(min(max_delay, retry_after))
+                elif delay > 0:
+                    # Jitter keeps concurrent callers that hit the same 429
+                    # from retrying in lockstep.
+                    time.sleep(delay + random.uniform(0, min(1.0, delay)))
                 if delay == 0:
                     delay = 1.0
                 else:
@@ -272,19 +435,45 @@ class LLMClient:
         # Unreachable path, loop either returns or raises.
         raise RuntimeError("Retry loop terminated unexpectedly.")
 
+    def _wait_for_rate_slot(self) -> None:
+        # Blocks before sending once the last minute's quota is spent, rather
+        # than spending a round-trip on a 429.
+        rpm = self._settings.gemini_rpm_limit
+        if rpm <= 0:
+            return
+        while True:
+            with self._rate_lock:
+                now = time.monotonic()
+                while self._sent_at and now - self._sent_at[0] >= 60.0:
+                    self._sent_at.popleft()
+                if len(self._sent_at) < rpm:
+                    self._sent_at.append(now)
+                    return
+                wait = 60.0 - (now - self._sent_at[0])
+            time.sleep(wait)
+
+    def _retry_after_seconds(self, exc: Exception) -> Optional[float]:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            try:
+                value = headers.get("retry-after") or headers.get("Retry-After")
+                if value is not None:
+                    return max(0.0, float(value))
+            except (AttributeError, TypeError, ValueError):
+                # HTTP-date values and odd header containers fall through.
+                pass
+
+        match = _RE_RETRY_AFTER.search(str(exc))
+        if match:
+            return float(match.group(1))
+        return None
+
     def _is_retryable(self, exc: Exception) -> bool:
-        text = str(exc).lower()
-        signals = (
-            "429",
-            "resource_exhausted",
-            "rate limit",
-            "rate-limit",
-            "quota",
-            "too many requests",
-            "temporarily unavailable",
-            "deadline exceeded",
-        )
-        return any(token in text for token in signals)
+        for attr in ("status_code", "code"):
+            if getattr(exc, attr, None) in _RETRYABLE_STATUS:
+                return True
+        return bool(_RE_RETRYABLE.search(str(exc)))
 
     def _extract_cache_name(self, created: Any) -> Optional[str]:
         name = getattr(created, "name", None)
@@ -297,11 +486,24 @@ class LLMClient:
         return None
 
     def _context_hash(self, context: str) -> str:
+        # answer() and the cache path hash the same context object back to
+        # back, so the last result is reused while the string is unchanged.
+        model = self._settings.gemini_model
+        memo = self._context_hash_memo
+        if memo is not None and memo[0] is context and memo[1] == model:
+            return memo[2]
+
         digest = hashlib.sha256()
-        digest.update(self._settings.gemini_model.encode("utf-8"))
+        digest.update(model.encode("utf-8"))
         digest.update(b"\n")
-        digest.update(context.encode("utf-8", errors="ignore"))
-        return digest.hexdigest()
+        # Encoding in slices avoids a second full-size bytes copy of large
+        # contexts; UTF-8 is per code point, so the digest is unchanged.
+        step = self.CONTEXT_HASH_SLICE_CHARS
+        for start in range(0, len(context), step):
+            digest.update(context[start : start + step].encode("utf-8", errors="ignore"))
+        value = digest.hexdigest()
+        self._context_hash_memo = (context, model, value)
+        return value
 
     def _cache_entry_valid(self, entry: Dict[str, Any]) -> bool:
         if entry.get("model") != self._settings.gemini_model:
@@ -312,23 +514,107 @@ class LLMClient:
         return expires_at > int(time.time())
 
     def _load_cache_index(self) -> None:
-        if not self._cache_index_path.exists():
+        # The index used to be a JSON file; the database lives beside it and
+        # imports any entries left there.
+        path = self._cache_index_path
+        if path.suffix.lower() == ".json":
+            path = path.with_suffix(".sqlite3")
+        legacy_path = path.with_suffix(".json")
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS context_cache ("
+                "context_hash TEXT PRIMARY KEY, name TEXT NOT NULL, expires_at INTEGER NOT NULL, "
+                "mode TEXT, model TEXT)"
+            )
+        except (OSError, sqlite3.Error):
+            # Without a database the in-memory LRU still serves this process.
             return
+        self._cache_db = db
+
+        if legacy_path.exists():
+            self._import_legacy_cache_index(legacy_path)
 
+    def _import_legacy_cache_index(self, legacy_path: Path) -> None:
         try:
-            data = json.loads(self._cache_index_path.read_text(encoding="utf-8"))
-            if isinstance(data, dict):
-                self._cache_index = data
+            data = json.loads(legacy_path.read_text(encoding="utf-8"))
         except Exception:
-            self._cache_index = {}
+            return
+        if not isinstance(data, dict):
+            return
 
-    def _save_cache_index(self) -> None:
+        rows = []
+        for context_hash, entry in data.items():
+            if not isinstance(entry, dict):
+                continue
+            name = entry.get("name")
+            expires_at = entry.get("expires_at")
+            if isinstance(name, str) and isinstance(expires_at, int):
+                rows.append((context_hash, name, expires_at, entry.get("mode"), entry.get("model")))
         try:
-            self._cache_index_path.parent.mkdir(parents=True, exist_ok=True)
-            self._cache_index_path.write_text(
-                json.dumps(self._cache_index, indent=2, sort_keys=True),
-                encoding="utf-8",
-            )
-        except Exception:
-            # Cache persistence failures should never break answering.
+            with self._cache_lock:
+                # INSERT OR IGNORE: entries already in the database are newer.
+                self._cache_db.executemany(
+                    "INSERT OR IGNORE INTO context_cache (context_hash, name, expires_at, mode, model) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error:
             pass
+
+    def _cache_lookup(self, context_hash: str) -> Optional[Dict[str, Any]]:
+        with self._cache_lock:
+            entry = self._cache_index.get(context_hash)
+            if entry is not None:
+                self._cache_index.move_to_end(context_hash)
+                return entry
+            if self._cache_db is None:
+                return None
+            try:
+                row = self._cache_db.execute(
+                    "SELECT name, expires_at, mode, model FROM context_cache WHERE context_hash = ?",
+                    (context_hash,),
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            entry = {"name": row[0], "expires_at": row[1], "mode": row[2], "model": row[3]}
+            self._remember_cache_entry(context_hash, entry)
+            return entry
+
+    def _cache_store(self, context_hash: str, entry: Dict[str, Any]) -> None:
+        with self._cache_lock:
+            self._remember_cache_entry(context_hash, entry)
+            if self._cache_db is None:
+                return
+            try:
+                self._cache_db.execute(
+                    "INSERT OR REPLACE INTO context_cache (context_hash, name, expires_at, mode, model) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (context_hash, entry["name"], entry["expires_at"], entry.get("mode"), entry.get("model")),
+                )
+            except sqlite3.Error:
+                # Cache persistence failures should never break answering.
+                pass
+
+    def _cache_forget(self, context_hash: str) -> None:
+        with self._cache_lock:
+            self._cache_index.pop(context_hash, None)
+            if self._cache_db is None:
+                return
+            try:
+                self._cache_db.execute("DELETE FROM context_cache WHERE context_hash = ?", (context_hash,))
+            except sqlite3.Error:
+                pass
+
+    def _remember_cache_entry(self, context_hash: str, entry: Dict[str, Any]) -> None:
+        # Caller must hold self._cache_lock.
+        self._cache_index[context_hash] = entry
+        self._cache_index.move_to_end(context_hash)
+        while len(self._cache_index) > self.CACHE_INDEX_MEMORY_ENTRIES:
+            self._cache_index.popitem(last=False)
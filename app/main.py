@@ -1,25 +1,32 @@
 from __future__ import annotations
 
-import time
+import asyncio
+import hmac
+import logging
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import AbstractSet, Any, Callable, Dict, List, Optional, Tuple, Union
 from uuid import uuid4
 
 from fastapi import FastAPI, File, Header, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
-from app.audit_log import AuditLogger
+from app.audit_log import HAS_ORJSON, AuditLogger
 from app.config import Settings, get_settings
-from app.document_store import DocumentStore
+from app.document_store import SUPPORTED_EXTENSIONS, DocumentStore
 from app.engines.long_context_engine import LongContextEngine
 from app.engines.rag_engine import RAGEngine
 from app.llm_client import LLMClient
 from app.models import (
+    AskBatchRequest,
+    AskBatchResponse,
     AskRequest,
     AskResponse,
     AuditVerifyResponse,
+    BenchmarkBatchRequest,
+    BenchmarkBatchResponse,
     BenchmarkRequest,
     BenchmarkResponse,
     DocumentInfo,
@@ -29,17 +36,17 @@ from app.models import (
     OpenClawSyncResponse,
 )
 from app.security import RBACAuthorizer
+from app.tfidf_index import TfidfIndex
 
 settings = get_settings()
+# Settings are fixed for the process lifetime, so derived values are frozen once.
+_ALLOWED_EXTENSIONS = frozenset(settings.allowed_extensions())
 store = DocumentStore(upload_dir=Path("uploads"), enable_pii_redaction=settings.enable_pii_redaction)
 store.load_existing_files()
-if settings.openclaw_monitored_dir:
-    monitored = Path(settings.openclaw_monitored_dir).expanduser()
-    if monitored.exists() and monitored.is_dir():
-        store.ingest_folder(monitored, allowed_extensions=set(settings.allowed_extensions()))
 
 llm = LLMClient(settings)
-rag_engine = RAGEngine(store, llm)
+tfidf_index = TfidfIndex()
+rag_engine = RAGEngine(store, llm, tfidf_index)
 
 
 def _context_limits(cfg: Settings) -> Tuple[int, int]:
@@ -53,14 +60,25 @@ max_chars, max_tokens = _context_limits(settings)
 long_context_engine = LongContextEngine(
     store,
     llm,
+    tfidf_index,
     max_context_chars=max_chars,
     max_context_tokens=max_tokens,
 )
 
 authorizer = RBACAuthorizer(settings)
-audit_logger = AuditLogger(settings.audit_log_path, settings.audit_hash_seed)
+audit_logger = AuditLogger(
+    settings.audit_log_path,
+    settings.audit_hash_seed,
+    flush_max_records=settings.audit_flush_max_records,
+    flush_interval_seconds=settings.audit_flush_interval_seconds,
+    fsync=settings.audit_fsync,
+)
 
-app = FastAPI(title="Clinical Protocol Navigator", version="0.2.0")
+app = FastAPI(
+    title="Clinical Protocol Navigator",
+    version="0.2.0",
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -73,17 +91,42 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+_OPENCLAW_STATUS: Dict[str, Any] = {
+    "enabled": True,
+    "folder_sync_enabled": settings.openclaw_enable_folder_sync,
+    "monitored_dir": settings.openclaw_monitored_dir,
+    "allowed_extensions": settings.allowed_extensions(),
+    "auth_required": bool(settings.openclaw_shared_secret.strip()),
+    "context_profile": settings.context_profile,
+    "max_context_chars": max_chars,
+    "max_context_tokens": max_tokens,
+    "benchmark_inter_mode_delay_seconds": settings.benchmark_inter_mode_delay_seconds,
+}
+_OPENCLAW_SECRET = settings.openclaw_shared_secret.strip().encode("utf-8")
+# Store versions restart at zero with the process, so ETags carry a boot id.
+_BOOT_ID = uuid4().hex[:12]
+# Revalidate on every poll: the ETag makes that a cheap 304, and the list is
+# never served stale right after an upload or reset.
+POLL_CACHE_CONTROL = "private, no-cache"
+# Tracks the monitored-folder ingest kicked off at startup; the task is held
+# here so it is not garbage-collected while running.
+_startup_ingest: Dict[str, Any] = {"ingesting": False, "task": None, "error": None}
+logger = logging.getLogger(__name__)
+
+
 def _check_openclaw_secret(openclaw_secret: Optional[str]) -> None:
-    expected = settings.openclaw_shared_secret.strip()
-    if not expected:
+    if not _OPENCLAW_SECRET:
         return
-    if not openclaw_secret or openclaw_secret != expected:
+    # Constant-time compare so response timing does not leak the secret.
+    if not openclaw_secret or not hmac.compare_digest(openclaw_secret.encode("utf-8"), _OPENCLAW_SECRET):
         raise HTTPException(status_code=401, detail="Invalid OpenClaw secret")
 
 
-def _extension_set(overrides: Optional[List[str]]) -> Set[str]:
-    values = overrides if overrides else settings.allowed_extensions()
-    return {x.strip().lower() for x in values if x and x.startswith(".")}
+def _extension_set(overrides: Optional[List[str]]) -> AbstractSet[str]:
+    if not overrides:
+        return _ALLOWED_EXTENSIONS
+    return {x.strip().lower() for x in overrides if x and x.startswith(".")}
 
 
 def _authorize(request: Request, permission: str, fallback_role: Optional[str] = None) -> str:
@@ -93,28 +136,101 @@ def _authorize(request: Request, permission: str, fallback_role: Optional[str] =
     return authorizer.ensure(permission=permission, role_value=role)
 
 
-def _audit(event_type: str, payload: Dict[str, Any]) -> None:
+def _audit(event_type: str, build_payload: Callable[[], Dict[str, Any]]) -> None:
+    # Payloads are built lazily so disabled auditing skips the model dumps.
+    if not settings.audit_enabled:
+        return
     try:
-        audit_logger.append(event_type=event_type, payload=payload)
+        audit_logger.append(event_type=event_type, payload=build_payload())
     except Exception:
         # Audit failures should not block request flow in this prototype.
         pass
 
 
+async def _run_both_modes(
+    rag_fn: Callable[..., Any],
+    long_context_fn: Callable[..., Any],
+    *args: Any,
+) -> Tuple[Any, Any]:
+    if settings.benchmark_inter_mode_delay_seconds > 0:
+        # The delay exists to space out upstream calls, so keep them serial.
+        rag = await run_in_threadpool(rag_fn, *args)
+        await asyncio.sleep(settings.benchmark_inter_mode_delay_seconds)
+        long_context = await run_in_threadpool(long_context_fn, *args)
+        return rag, long_context
+    rag, long_context = await asyncio.gather(
+        run_in_threadpool(rag_fn, *args),
+        run_in_threadpool(long_context_fn, *args),
+    )
+    return rag, long_context
+
+
+def _cache_headers(request: Request, response: Response, version: str) -> Optional[Response]:
+    # Weak validators for endpoints dashboards poll; a match skips building
+    # and serialising the body entirely.
+    etag = 'W/"%s-%s"' % (_BOOT_ID, version)
+    headers = {"ETag": etag, "Cache-Control": POLL_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (x.strip() for x in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def _ingest_monitored_dir(folder: Path) -> None:
+    try:
+        await run_in_threadpool(store.ingest_folder, folder, allowed_extensions=_ALLOWED_EXTENSIONS)
+    finally:
+        _startup_ingest["ingesting"] = False
+
+
+def _startup_ingest_done(task: "asyncio.Task[None]") -> None:
+    # The task is never awaited, so its failure is surfaced here rather
+    # than lost; /api/health reports it alongside the partial corpus.
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error("Startup ingest of the monitored folder failed", exc_info=exc)
+        _startup_ingest["error"] = "%s: %s" % (type(exc).__name__, exc)
+
+
+@app.on_event("startup")
+async def _bootstrap_ingest() -> None:
+    # Large monitored folders are ingested in the background so the server
+    # accepts requests immediately; /api/health reports when it is done.
+    if not settings.openclaw_monitored_dir:
+        return
+    monitored = Path(settings.openclaw_monitored_dir).expanduser()
+    if monitored.is_dir():
+        _startup_ingest["ingesting"] = True
+        task = asyncio.create_task(_ingest_monitored_dir(monitored))
+        task.add_done_callback(_startup_ingest_done)
+        _startup_ingest["task"] = task
+
+
 @app.get("/")
 def index() -> FileResponse:
     return FileResponse("app/static/index.html")
 
 
 @app.get("/api/health")
-def health(request: Request) -> Dict[str, str]:
+def health(request: Request) -> Dict[str, Any]:
     _authorize(request, "read")
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "ingesting": _startup_ingest["ingesting"],
+        "ingest_error": _startup_ingest["error"],
+        "document_count": len(store.list_documents()),
+    }
 
 
 @app.get("/api/documents", response_model=List[DocumentInfo])
-def list_documents(request: Request) -> List[DocumentInfo]:
+def list_documents(request: Request, response: Response) -> Union[List[DocumentInfo], Response]:
     _authorize(request, "read")
+    not_modified = _cache_headers(request, response, str(store.version))
+    if not_modified is not None:
+        return not_modified
     return store.list_documents()
 
 
@@ -127,19 +243,38 @@ async def upload_documents(request: Request, files: List[UploadFile] = File(...)
     infos: List[DocumentInfo] = []
     for upload in files:
         suffix = Path(upload.filename or "").suffix.lower()
-        if suffix not in {".pdf", ".txt", ".md"}:
+        if suffix not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Unsupported file type: %s" % upload.filename)
 
+        max_bytes = settings.max_upload_mb * 1024 * 1024
+        declared_size = getattr(upload, "size", None)
+        if max_bytes and declared_size is not None and declared_size > max_bytes:
+            raise HTTPException(status_code=413, detail="File too large: %s" % upload.filename)
+
         original_name = upload.filename or "uploaded_document"
         safe_name = "%s_%s" % (uuid4().hex, original_name)
         path = Path("uploads") / safe_name
-        content = await upload.read()
-        path.write_bytes(content)
-        infos.append(store.ingest_file(path, source_name=original_name))
+        # Streamed in fixed-size chunks so memory stays flat regardless of
+        # file size; the declared size is re-checked against actual bytes.
+        written = 0
+        try:
+            with path.open("wb") as dst:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if max_bytes and written > max_bytes:
+                        raise HTTPException(status_code=413, detail="File too large: %s" % upload.filename)
+                    await run_in_threadpool(dst.write, chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        infos.append(await run_in_threadpool(store.ingest_file, path, source_name=original_name))
 
     _audit(
         "documents_upload",
-        {
+        lambda: {
             "role": role,
             "uploaded_count": len(infos),
             "documents": [x.model_dump() for x in infos],
@@ -162,7 +297,7 @@ def reset_documents(request: Request, delete_uploaded_files: bool = True) -> Dic
     }
     _audit(
         "documents_reset",
-        {
+        lambda: {
             "role": role,
             "removed_documents": before,
             "remaining_documents": after,
@@ -173,16 +308,15 @@ def reset_documents(request: Request, delete_uploaded_files: bool = True) -> Dic
 
 
 @app.post("/api/ask", response_model=AskResponse)
-def ask(request: Request, payload: AskRequest) -> AskResponse:
+async def ask(request: Request, payload: AskRequest) -> AskResponse:
     role = _authorize(request, "query")
-    if payload.mode == "rag":
-        response = rag_engine.ask(payload.question, payload.top_k)
-    else:
-        response = long_context_engine.ask(payload.question, payload.top_k)
+    # Engines block on Gemini for seconds; run them off the event loop.
+    engine = rag_engine if payload.mode == "rag" else long_context_engine
+    response = await run_in_threadpool(engine.ask, payload.question, payload.top_k)
 
     _audit(
         "ask",
-        {
+        lambda: {
             "role": role,
             "mode": payload.mode,
             "top_k": payload.top_k,
@@ -198,17 +332,16 @@ def ask(request: Request, payload: AskRequest) -> AskResponse:
 
 
 @app.post("/api/benchmark", response_model=BenchmarkResponse)
-def benchmark(request: Request, payload: BenchmarkRequest) -> BenchmarkResponse:
+async def benchmark(request: Request, payload: BenchmarkRequest) -> BenchmarkResponse:
     role = _authorize(request, "query")
-    rag = rag_engine.ask(payload.question, payload.top_k)
-    if settings.benchmark_inter_mode_delay_seconds > 0:
-        time.sleep(settings.benchmark_inter_mode_delay_seconds)
-    long_context = long_context_engine.ask(payload.question, payload.top_k)
+    rag, long_context = await _run_both_modes(
+        rag_engine.ask, long_context_engine.ask, payload.question, payload.top_k
+    )
     response = BenchmarkResponse(question=payload.question, rag=rag, long_context=long_context)
 
     _audit(
         "benchmark",
-        {
+        lambda: {
             "role": role,
             "top_k": payload.top_k,
             "question": payload.question,
@@ -231,20 +364,70 @@ def benchmark(request: Request, payload: BenchmarkRequest) -> BenchmarkResponse:
     return response
 
 
-@app.get("/api/openclaw/status")
-def openclaw_status(request: Request) -> Dict[str, Any]:
+@app.post("/api/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(request: Request, payload: AskBatchRequest) -> AskBatchResponse:
+    role = _authorize(request, "query")
+    engine = rag_engine if payload.mode == "rag" else long_context_engine
+    results = await run_in_threadpool(engine.ask_batch, payload.questions, payload.top_k)
+
+    _audit(
+        "ask_batch",
+        lambda: {
+            "role": role,
+            "mode": payload.mode,
+            "top_k": payload.top_k,
+            "questions": payload.questions,
+            "latency_ms": results[0].latency_ms if results else 0,
+            "context_chunks": results[0].context_chunks if results else 0,
+            "context_tokens": results[0].context_tokens if results else 0,
+            "citations": [[c.model_dump() for c in r.citations] for r in results],
+        },
+    )
+    return AskBatchResponse(mode=payload.mode, results=results)
+
+
+@app.post("/api/benchmark/batch", response_model=BenchmarkBatchResponse)
+async def benchmark_batch(request: Request, payload: BenchmarkBatchRequest) -> BenchmarkBatchResponse:
+    role = _authorize(request, "query")
+    rag, long_context = await _run_both_modes(
+        rag_engine.ask_batch, long_context_engine.ask_batch, payload.questions, payload.top_k
+    )
+    results = [
+        BenchmarkResponse(question=question, rag=rag_result, long_context=lc_result)
+        for question, rag_result, lc_result in zip(payload.questions, rag, long_context)
+    ]
+
+    _audit(
+        "benchmark_batch",
+        lambda: {
+            "role": role,
+            "top_k": payload.top_k,
+            "questions": payload.questions,
+            "rag": {
+                "latency_ms": rag[0].latency_ms if rag else 0,
+                "context_chunks": rag[0].context_chunks if rag else 0,
+                "context_tokens": rag[0].context_tokens if rag else 0,
+                "fallback": any(r.answer.startswith("LLM fallback:") for r in rag),
+            },
+            "long_context": {
+                "latency_ms": long_context[0].latency_ms if long_context else 0,
+                "context_chunks": long_context[0].context_chunks if long_context else 0,
+                "context_tokens": long_context[0].context_tokens if long_context else 0,
+                "fallback": any(r.answer.startswith("LLM fallback:") for r in long_context),
+            },
+        },
+    )
+    return BenchmarkBatchResponse(results=results)
+
+
+@app.get("/api/openclaw/status", response_model=None)
+def openclaw_status(request: Request, response: Response) -> Union[Dict[str, Any], Response]:
     _authorize(request, "read")
-    return {
-        "enabled": True,
-        "folder_sync_enabled": settings.openclaw_enable_folder_sync,
-        "monitored_dir": settings.openclaw_monitored_dir,
-        "allowed_extensions": settings.allowed_extensions(),
-        "auth_required": bool(settings.openclaw_shared_secret.strip()),
-        "context_profile": settings.context_profile,
-        "max_context_chars": max_chars,
-        "max_context_tokens": max_tokens,
-        "benchmark_inter_mode_delay_seconds": settings.benchmark_inter_mode_delay_seconds,
-    }
+    # The payload is fixed for the process lifetime.
+    not_modified = _cache_headers(request, response, "status")
+    if not_modified is not None:
+        return not_modified
+    return _OPENCLAW_STATUS
 
 
 @app.get("/api/openclaw/handshake", response_model=OpenClawHandshakeResponse)
@@ -283,7 +466,8 @@ def openclaw_sync_folder(
     if not folder.exists() or not folder.is_dir():
         raise HTTPException(status_code=400, detail="Folder not found: %s" % folder)
 
-    infos = store.ingest_folder(folder, allowed_extensions=_extension_set(payload.extensions))
+    names = set(payload.files) if payload.files is not None else None
+    infos = store.ingest_folder(folder, allowed_extensions=_extension_set(payload.extensions), names=names)
     response = OpenClawSyncResponse(
         folder_path=str(folder),
         ingested_count=len(infos),
@@ -291,7 +475,7 @@ def openclaw_sync_folder(
     )
     _audit(
         "openclaw_sync_folder",
-        {
+        lambda: {
             "role": role,
             "folder_path": str(folder),
             "ingested_count": len(infos),
@@ -302,7 +486,7 @@ def openclaw_sync_folder(
 
 
 @app.post("/api/openclaw/ask")
-def openclaw_ask(
+async def openclaw_ask(
     request: Request,
     payload: OpenClawAskRequest,
     x_openclaw_secret: Optional[str] = Header(default=None),
@@ -311,10 +495,10 @@ def openclaw_ask(
     _check_openclaw_secret(x_openclaw_secret)
 
     if payload.benchmark:
-        result = benchmark(request, BenchmarkRequest(question=payload.question, top_k=payload.top_k))
+        result = await benchmark(request, BenchmarkRequest(question=payload.question, top_k=payload.top_k))
         _audit(
             "openclaw_ask_benchmark",
-            {
+            lambda: {
                 "role": role,
                 "question": payload.question,
                 "top_k": payload.top_k,
@@ -322,10 +506,10 @@ def openclaw_ask(
         )
         return {"source": "openclaw", "result": result.model_dump()}
 
-    result = ask(request, AskRequest(question=payload.question, mode=payload.mode, top_k=payload.top_k))
+    result = await ask(request, AskRequest(question=payload.question, mode=payload.mode, top_k=payload.top_k))
     _audit(
         "openclaw_ask",
-        {
+        lambda: {
             "role": role,
             "question": payload.question,
             "mode": payload.mode,
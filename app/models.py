@@ -1,14 +1,30 @@
 from dataclasses import dataclass
 from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 Mode = Literal["rag", "long_context"]
 
+# Questions answered by one Gemini call on the batch endpoints.
+MAX_BATCH_QUESTIONS = 8
+
 
 @dataclass
 class Chunk:
+    # Declared by hand (dataclass(slots=True) needs 3.10): drops the per-chunk
+    # __dict__, which dominates memory for large corpora.
+    __slots__ = (
+        "chunk_id",
+        "doc_id",
+        "doc_name",
+        "page",
+        "paragraph_start",
+        "paragraph_end",
+        "ordinal",
+        "text",
+    )
+
     chunk_id: str
     doc_id: str
     doc_name: str
@@ -54,6 +70,36 @@ class BenchmarkResponse(BaseModel):
     long_context: AskResponse
 
 
+class _QuestionBatch(BaseModel):
+    questions: List[str] = Field(min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    top_k: int = Field(default=8, ge=1, le=20)
+
+    @field_validator("questions")
+    @classmethod
+    def _check_questions(cls, value: List[str]) -> List[str]:
+        for question in value:
+            if len(question) < 3:
+                raise ValueError("Each question must be at least 3 characters")
+        return value
+
+
+class AskBatchRequest(_QuestionBatch):
+    mode: Mode = "rag"
+
+
+class AskBatchResponse(BaseModel):
+    mode: Mode
+    results: List[AskResponse]
+
+
+class BenchmarkBatchRequest(_QuestionBatch):
+    pass
+
+
+class BenchmarkBatchResponse(BaseModel):
+    results: List[BenchmarkResponse]
+
+
 class DocumentInfo(BaseModel):
     doc_id: str
     doc_name: str
@@ -64,6 +110,8 @@ class DocumentInfo(BaseModel):
 class OpenClawSyncRequest(BaseModel):
     folder_path: Optional[str] = None
     extensions: Optional[List[str]] = None
+    # File names inside folder_path to ingest; omitted means the whole folder.
+    files: Optional[List[str]] = None
 
 
 class OpenClawAskRequest(BaseModel):
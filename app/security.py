@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, Set
+from typing import Dict, FrozenSet, Set, Tuple
 
 from fastapi import HTTPException
 
@@ -18,17 +18,22 @@ ROLE_PERMISSIONS: Dict[str, Set[str]] = {
 class RBACAuthorizer:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
+        # Flattened once so each request is a single set membership test.
+        self._allow: FrozenSet[Tuple[str, str]] = frozenset(
+            (role, permission) for role, permissions in ROLE_PERMISSIONS.items() for permission in permissions
+        )
+        self._superusers: FrozenSet[str] = frozenset(
+            role for role, permissions in ROLE_PERMISSIONS.items() if "admin" in permissions
+        )
 
     def ensure(self, permission: str, role_value: str) -> str:
         if not self.settings.rbac_enabled:
             return role_value or "rbac_disabled"
 
         role = (role_value or self.settings.rbac_default_role).strip().lower()
-        permissions = ROLE_PERMISSIONS.get(role)
-        if not permissions:
-            raise HTTPException(status_code=403, detail="Unknown role: %s" % role)
-
-        if permission not in permissions and "admin" not in permissions:
-            raise HTTPException(status_code=403, detail="Role '%s' lacks permission '%s'" % (role, permission))
+        if role in self._superusers or (role, permission) in self._allow:
+            return role
 
-        return role
+        if not ROLE_PERMISSIONS.get(role):
+            raise HTTPException(status_code=403, detail="Unknown role: %s" % role)
+        raise HTTPException(status_code=403, detail="Role '%s' lacks permission '%s'" % (role, permission))
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.document_store import DocumentStore
+from app.models import Chunk
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    version: int
+    vectorizer: TfidfVectorizer
+    matrix: Any
+    chunks: List[Chunk]
+    # Matrix row for each entry of `chunks`; identical texts share one row.
+    inverse: np.ndarray
+
+    def scores(self, question: str) -> np.ndarray:
+        qv = self.vectorizer.transform([question])
+        # Rows and query are l2-normalised, so the dot product is the cosine.
+        return (self.matrix @ qv.T).toarray().ravel()[self.inverse]
+
+
+class TfidfIndex:
+    """One TF-IDF matrix over the store's chunks, shared by both answer engines."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._snapshot: Optional[IndexSnapshot] = None
+
+    def get(self, store: DocumentStore) -> IndexSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == store.version:
+            return snapshot
+
+        with self._lock:
+            # Read the version before the chunks: an ingest landing in between
+            # leaves the snapshot tagged stale, so the next call rebuilds it.
+            version = store.version
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            # Copied: the store extends its chunk list in place on ingest.
+            chunks = list(store.all_chunks())
+            # Repeated boilerplate (headers, disclaimers) is fitted once and
+            # its scores broadcast back to every chunk carrying it.
+            unique: Dict[str, int] = {}
+            inverse = np.fromiter(
+                (unique.setdefault(c.text, len(unique)) for c in chunks), dtype=np.intp, count=len(chunks)
+            )
+            texts = list(unique)
+            try:
+                vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words="english", dtype=np.float32)
+                matrix = vectorizer.fit_transform(texts)
+            except ValueError:
+                # Handles corpora that reduce to stop words only.
+                vectorizer = TfidfVectorizer(ngram_range=(1, 2), dtype=np.float32)
+                matrix = vectorizer.fit_transform(texts)
+
+            snapshot = IndexSnapshot(
+                version=version,
+                vectorizer=vectorizer,
+                matrix=matrix,
+                chunks=chunks,
+                inverse=inverse,
+            )
+            self._snapshot = snapshot
+            return snapshot
@@ -7,13 +7,55 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
+import http.client
+import io
 import json
+import random
+import re
+import sqlite3
 import sys
+import threading
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from urllib import error, request
+from typing import Any, Dict, List, Optional, Tuple
+from urllib import error
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except Exception:
+    orjson = None
+    HAS_ORJSON = False
+
+
+_RE_WS = re.compile(r"\s+")
+
+
+# Built once rather than per call; compact separators match orjson's output.
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _dumps(obj: Any) -> bytes:
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects a few values stdlib json accepts (e.g. >64-bit ints).
+            pass
+    return _json_encode(obj).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 DEFAULT_QUESTIONS = [
@@ -37,8 +79,32 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API base URL.")
     parser.add_argument("--endpoint", default="/api/benchmark", help="Benchmark endpoint path.")
     parser.add_argument("--top-k", type=int, default=8, help="Top-k setting in request payload.")
-    parser.add_argument("--timeout", type=float, default=180.0, help="HTTP timeout in seconds.")
-    parser.add_argument("--sleep-seconds", type=float, default=0.0, help="Delay between questions.")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Maximum HTTP timeout in seconds.")
+    parser.add_argument(
+        "--min-timeout",
+        type=float,
+        default=30.0,
+        help="Lower bound for the adaptive timeout (5x the moving average of recent latencies).",
+    )
+    parser.add_argument("--sleep-seconds", type=float, default=0.0, help="Delay between requests; forces a serial run.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Requests in flight at once (1 = serial). Rows are still written in question order.",
+    )
+    parser.add_argument(
+        "--connection-pool-size",
+        type=int,
+        help="Idle keep-alive connections kept for reuse (default: --concurrency).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Questions per request. Above 1, questions are sent to --batch-endpoint (server max 8).",
+    )
+    parser.add_argument("--batch-endpoint", default="/api/benchmark/batch", help="Batch benchmark endpoint path.")
     parser.add_argument(
         "--questions-file",
         help="Optional text file with one question per line. Lines starting with '#' are ignored.",
@@ -48,6 +114,19 @@ def parse_args() -> argparse.Namespace:
         action="append",
         help="Optional extra question. Can be supplied multiple times.",
     )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries for 5xx responses and connection errors, with jittered exponential backoff.",
+    )
+    parser.add_argument("--backoff", type=float, default=0.5, help="Base backoff in seconds (doubles per retry).")
+    parser.add_argument(
+        "--cache-db",
+        default="data/bench_cache.sqlite",
+        help="SQLite cache of successful responses; repeat questions are answered from it.",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always query the server and skip the cache.")
     parser.add_argument("--output-csv", help="Output CSV path.")
     parser.add_argument("--output-jsonl", help="Output JSONL path.")
     parser.add_argument(
@@ -80,56 +159,119 @@ def load_questions(args: argparse.Namespace) -> List[str]:
                 questions.append(text)
 
     # De-duplicate while preserving order.
-    seen = set()
-    deduped: List[str] = []
-    for q in questions:
-        if q in seen:
-            continue
-        seen.add(q)
-        deduped.append(q)
-
+    deduped = list(dict.fromkeys(questions))
     if not deduped:
         raise ValueError("no questions were loaded")
     return deduped
 
 
+# Raised when a kept-alive connection was closed by the server between calls.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+Origin = Tuple[str, str, Optional[int]]
+# Beyond roughly this many concurrent requests a single model server
+# saturates; more client parallelism only adds queueing.
+CONCURRENCY_WARN_THRESHOLD = 130
+
+
+class ConnectionPool:
+    """Idle keep-alive connections shared by the worker threads.
+
+    An http.client connection carries one request at a time, so each
+    request borrows one. Up to `size` idle connections per origin are
+    kept for reuse; any extra opened under higher concurrency are closed
+    after their request.
+    """
+
+    def __init__(self, size: int = 8) -> None:
+        self.size = size
+        self._idle: Dict[Origin, List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, origin: Origin, timeout: float, fresh: bool = False) -> http.client.HTTPConnection:
+        conn = None
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get(origin)
+                if idle:
+                    conn = idle.pop()
+        if conn is None:
+            scheme, host, port = origin
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(host, port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def release(self, origin: Origin, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+_pool = ConnectionPool()
+
+
+def _target(url: str) -> Tuple[Origin, str]:
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path = "%s?%s" % (path, parts.query)
+    return (parts.scheme, parts.hostname or "", parts.port), path
+
+
 def post_json(url: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
-    body = json.dumps(payload).encode("utf-8")
-    req = request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with request.urlopen(req, timeout=timeout) as resp:
-        data = resp.read().decode("utf-8")
-        return json.loads(data)
+    body = _dumps(payload)
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+    origin, path = _target(url)
+    for attempt in range(2):
+        # The retry gets a new socket rather than another possibly stale idle one.
+        conn = _pool.acquire(origin, timeout, fresh=attempt > 0)
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            break
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if attempt:
+                raise
+        except Exception:
+            conn.close()
+            raise
+    _pool.release(origin, conn)
+    if resp.status >= 400:
+        # Same error type urlopen raised, so callers keep their handling.
+        raise error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+    return _loads(data)
 
 
 def unique_doc_names(citations: List[Dict[str, Any]], max_docs: int = 3) -> str:
-    names: List[str] = []
-    seen = set()
-    for item in citations:
-        name = str(item.get("doc_name", "")).strip()
-        if not name or name in seen:
-            continue
-        seen.add(name)
-        names.append(name)
-        if len(names) >= max_docs:
-            break
-    return "; ".join(names)
+    # dict.fromkeys is an insertion-ordered set: first occurrence wins.
+    names = dict.fromkeys(name for name in (str(c.get("doc_name", "")).strip() for c in citations) if name)
+    return "; ".join(islice(names, max_docs))
 
 
 def answer_excerpt(text: str, limit: int = 220) -> str:
-    compact = " ".join((text or "").split())
-    return compact[:limit]
+    return _RE_WS.sub(" ", text or "").strip()[:limit]
 
 
-def build_row(index: int, question: str, result: Optional[Dict[str, Any]], err: str) -> Dict[str, Any]:
+def build_row(
+    index: int, question: str, result: Optional[Dict[str, Any]], err: str, batch_size: int = 1
+) -> Dict[str, Any]:
     row: Dict[str, Any] = {
         "question_id": index,
         "question": question,
         "error": err,
+        "batch_size": batch_size,
     }
     if not result:
         return row
@@ -171,61 +313,374 @@ def _diff(a: Any, b: Any) -> Any:
     return ""
 
 
-def write_csv(path: Path, rows: List[Dict[str, Any]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    fieldnames = [
-        "question_id",
-        "question",
-        "error",
-        "rag_latency_ms",
-        "long_latency_ms",
-        "latency_delta_ms",
-        "rag_context_chunks",
-        "long_context_chunks",
-        "rag_context_tokens",
-        "long_context_tokens",
-        "rag_context_chars",
-        "long_context_chars",
-        "rag_citation_count",
-        "long_citation_count",
-        "rag_primary_docs",
-        "long_primary_docs",
-        "rag_fallback",
-        "long_fallback",
-        "rag_answer_excerpt",
-        "long_answer_excerpt",
-    ]
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
-
-
-def write_jsonl(path: Path, items: List[Dict[str, Any]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        for item in items:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
-
-
-def summarize(rows: List[Dict[str, Any]]) -> str:
-    ok_rows = [r for r in rows if not r.get("error")]
-    if not ok_rows:
-        return "No successful benchmark responses."
+CSV_FIELDS = [
+    "question_id",
+    "question",
+    "error",
+    "batch_size",
+    "rag_latency_ms",
+    "long_latency_ms",
+    "latency_delta_ms",
+    "rag_context_chunks",
+    "long_context_chunks",
+    "rag_context_tokens",
+    "long_context_tokens",
+    "rag_context_chars",
+    "long_context_chars",
+    "rag_citation_count",
+    "long_citation_count",
+    "rag_primary_docs",
+    "long_primary_docs",
+    "rag_fallback",
+    "long_fallback",
+    "rag_answer_excerpt",
+    "long_answer_excerpt",
+]
+
 
-    rag_latencies = [int(r["rag_latency_ms"]) for r in ok_rows if str(r.get("rag_latency_ms")).isdigit()]
-    long_latencies = [int(r["long_latency_ms"]) for r in ok_rows if str(r.get("long_latency_ms")).isdigit()]
-    rag_fallbacks = sum(1 for r in ok_rows if str(r.get("rag_fallback")).lower() == "true")
-    long_fallbacks = sum(1 for r in ok_rows if str(r.get("long_fallback")).lower() == "true")
+class ResultWriter:
+    """Streams rows to CSV and JSONL as they complete, in question order.
+
+    Rows that finish early under --concurrency wait in a small reorder
+    buffer until every earlier question has been written.
+    """
+
+    def __init__(self, csv_path: Path, jsonl_path: Path) -> None:
+        csv_path.parent.mkdir(parents=True, exist_ok=True)
+        jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        self._csv_fh = csv_path.open("w", newline="", encoding="utf-8")
+        self._jsonl_fh = jsonl_path.open("w", encoding="utf-8")
+        self._csv = csv.DictWriter(self._csv_fh, fieldnames=CSV_FIELDS)
+        self._csv.writeheader()
+        self._next_id = 1
+        self._pending: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+
+    def add(self, row: Dict[str, Any], raw_item: Dict[str, Any]) -> None:
+        self._pending[row["question_id"]] = (row, raw_item)
+        while self._next_id in self._pending:
+            self._write(*self._pending.pop(self._next_id))
+            self._next_id += 1
+        self._csv_fh.flush()
+        self._jsonl_fh.flush()
+
+    def close(self) -> None:
+        # After --fail-fast some earlier questions never finish; keep the
+        # later ones that did.
+        for question_id in sorted(self._pending):
+            self._write(*self._pending[question_id])
+        self._pending.clear()
+        self._csv_fh.close()
+        self._jsonl_fh.close()
+
+    def _write(self, row: Dict[str, Any], raw_item: Dict[str, Any]) -> None:
+        self._csv.writerow(row)
+        self._jsonl_fh.write(_dumps(raw_item).decode("utf-8") + "\n")
+
+
+class RunningStats:
+    """Summary counters updated as each row is produced, so no rows are kept."""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.ok = 0
+        self.rag_count = 0
+        self.rag_sum = 0.0
+        self.rag_requests = 0.0
+        self.long_count = 0
+        self.long_sum = 0.0
+        self.long_requests = 0.0
+        self.batched = False
+        self.rag_fallbacks = 0
+        self.long_fallbacks = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.total += 1
+        if row.get("error"):
+            return
+        self.ok += 1
+        # A batched row carries the latency of the whole request, shared by
+        # batch_size questions; spreading it keeps the sums per question and
+        # lets 1/batch_size per row add up to the number of requests.
+        batch_size = max(1, row.get("batch_size") or 1)
+        self.batched = self.batched or batch_size > 1
+        rag_ms = row.get("rag_latency_ms")
+        if _is_latency(rag_ms):
+            self.rag_count += 1
+            self.rag_sum += rag_ms / batch_size
+            self.rag_requests += 1 / batch_size
+        long_ms = row.get("long_latency_ms")
+        if _is_latency(long_ms):
+            self.long_count += 1
+            self.long_sum += long_ms / batch_size
+            self.long_requests += 1 / batch_size
+        self.rag_fallbacks += row.get("rag_fallback") is True
+        self.long_fallbacks += row.get("long_fallback") is True
+
+
+def _is_latency(value: Any) -> bool:
+    # Latencies arrive as ints from the API; anything else was missing.
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def summarize(stats: RunningStats) -> str:
+    if not stats.ok:
+        return "No successful benchmark responses."
 
-    avg_rag = round(sum(rag_latencies) / len(rag_latencies), 2) if rag_latencies else "n/a"
-    avg_long = round(sum(long_latencies) / len(long_latencies), 2) if long_latencies else "n/a"
-    return (
+    avg_rag = round(stats.rag_sum / stats.rag_count, 2) if stats.rag_count else "n/a"
+    avg_long = round(stats.long_sum / stats.long_count, 2) if stats.long_count else "n/a"
+    summary = (
         "Completed %s questions (%s successful). Avg latency ms: RAG=%s, LONG=%s. "
         "Fallbacks: RAG=%s, LONG=%s."
-        % (len(rows), len(ok_rows), avg_rag, avg_long, rag_fallbacks, long_fallbacks)
+        % (stats.total, stats.ok, avg_rag, avg_long, stats.rag_fallbacks, stats.long_fallbacks)
     )
+    if stats.batched:
+        req_rag = round(stats.rag_sum / stats.rag_requests, 2) if stats.rag_requests else "n/a"
+        req_long = round(stats.long_sum / stats.long_requests, 2) if stats.long_requests else "n/a"
+        summary += (
+            " Batched: latency above is per question (request latency / batch_size); "
+            "avg per request ms: RAG=%s, LONG=%s. Context figures in batched rows cover the whole batch."
+            % (req_rag, req_long)
+        )
+    return summary
+
+
+class AdaptiveTimeout:
+    """Per-request timeout tracking an EWMA of recent successful latencies.
+
+    Starts at --timeout; once latencies are known a stuck request is cut
+    off at 5x the average (never below --min-timeout) instead of waiting
+    out the worst case.
+    """
+
+    ALPHA = 0.3
+    FACTOR = 5.0
+
+    def __init__(self, min_timeout: float, max_timeout: float) -> None:
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._ewma: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> float:
+        with self._lock:
+            ewma = self._ewma
+        if ewma is None:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, self.FACTOR * ewma))
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            if self._ewma is None:
+                self._ewma = seconds
+            else:
+                self._ewma = (1 - self.ALPHA) * self._ewma + self.ALPHA * seconds
+
+
+class RequestPolicy:
+    """Timeout and retry settings shared by every request in a run."""
+
+    def __init__(self, timeouts: AdaptiveTimeout, retries: int, backoff: float) -> None:
+        self.timeouts = timeouts
+        self.retries = max(0, retries)
+        self.backoff = backoff
+
+    def delay(self, attempt: int) -> float:
+        # Exponential with a little jitter so concurrent workers that failed
+        # together do not retry in lockstep.
+        return self.backoff * (2 ** attempt) + random.random() * 0.1
+
+
+def _is_transient(exc: Exception) -> bool:
+    # 5xx (e.g. 502/503 while the server restarts) and connection-level
+    # failures, including timeouts; 4xx responses will not change on retry.
+    if isinstance(exc, error.HTTPError):
+        return exc.code >= 500
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+def _describe(exc: Exception) -> str:
+    if isinstance(exc, error.HTTPError):
+        err_msg = "HTTP %s" % exc.code
+        try:
+            body = exc.read().decode("utf-8")
+            err_msg = "%s: %s" % (err_msg, body[:300])
+        except Exception:
+            pass
+        return err_msg
+    return "%s: %s" % (type(exc).__name__, str(exc))
+
+
+def request_json(url: str, payload: Dict[str, Any], policy: RequestPolicy, label: str) -> Tuple[Optional[Any], str]:
+    attempt = 0
+    while True:
+        started = time.time()
+        try:
+            result = post_json(url, payload, timeout=policy.timeouts.current())
+        except Exception as exc:
+            err_msg = _describe(exc)
+            if attempt < policy.retries and _is_transient(exc):
+                delay = policy.delay(attempt)
+                attempt += 1
+                print("  %s -> retry %s/%s in %.1fs: %s" % (label, attempt, policy.retries, delay, err_msg))
+                time.sleep(delay)
+                continue
+            print("  %s -> error: %s" % (label, err_msg))
+            return None, err_msg
+        policy.timeouts.observe(time.time() - started)
+        elapsed = round((time.time() - started) * 1000, 2)
+        print("  %s -> ok (%sms)" % (label, elapsed))
+        return result, ""
+
+
+class ResponseCache:
+    """SQLite store of successful benchmark responses, keyed by endpoint, top_k and question."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the worker threads; sqlite3 objects need the lock for that.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, response BLOB NOT NULL, batch_size INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(cache)")}
+        if "batch_size" not in columns:
+            self._db.execute("ALTER TABLE cache ADD COLUMN batch_size INTEGER NOT NULL DEFAULT 1")
+        self._db.commit()
+        self.hits = 0
+
+    @staticmethod
+    def _key(url: str, top_k: int, question: str) -> str:
+        return hashlib.sha256(("%s|%s|%s" % (url, top_k, question)).encode("utf-8")).hexdigest()
+
+    def get(self, url: str, top_k: int, question: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        """The cached response and the batch_size of the request that produced it."""
+        with self._lock:
+            found = self._db.execute(
+                "SELECT response, batch_size FROM cache WHERE key = ?", (self._key(url, top_k, question),)
+            ).fetchone()
+            if found is None:
+                return None
+            self.hits += 1
+        return _loads(zlib.decompress(found[0])), found[1]
+
+    def put(self, url: str, top_k: int, question: str, response: Dict[str, Any], batch_size: int = 1) -> None:
+        blob = zlib.compress(_dumps(response))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, response, batch_size) VALUES (?, ?, ?)",
+                (self._key(url, top_k, question), blob, batch_size),
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _cacheable(result: Optional[Dict[str, Any]]) -> bool:
+    # Fallback answers mean Gemini failed; keep them out so a rerun retries.
+    if not isinstance(result, dict):
+        return False
+    for mode in ("rag", "long_context"):
+        if str((result.get(mode) or {}).get("answer", "")).startswith("LLM fallback:"):
+            return False
+    return True
+
+
+# (endpoint, request payload, result, error, batch_size) for one question.
+Sent = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]], str, int]
+
+
+def _send_one(url: str, index: int, question: str, total: int, top_k: int, policy: RequestPolicy) -> Sent:
+    payload: Dict[str, Any] = {"question": question, "top_k": top_k}
+    result, err_msg = request_json(url, payload, policy, "[%s/%s]" % (index, total))
+    return url, payload, result, err_msg, 1
+
+
+def send_group(
+    url: str,
+    batch_url: str,
+    items: List[Tuple[int, str]],
+    total: int,
+    top_k: int,
+    policy: RequestPolicy,
+) -> List[Sent]:
+    """POST one group of (question_id, question) pairs; returns what was sent and received per question."""
+    if len(items) == 1:
+        return [_send_one(url, items[0][0], items[0][1], total, top_k, policy)]
+
+    payload = {"questions": [q for _, q in items], "top_k": top_k}
+    label = "[%s-%s/%s]" % (items[0][0], items[-1][0], total)
+    result, err_msg = request_json(batch_url, payload, policy, label)
+    if result is not None:
+        batch_results = result.get("results") if isinstance(result, dict) else None
+        if isinstance(batch_results, list) and len(batch_results) == len(items):
+            return [(batch_url, payload, item, "", len(items)) for item in batch_results]
+    elif not err_msg.startswith(("HTTP 404", "HTTP 405")):
+        return [(batch_url, payload, None, err_msg, len(items))] * len(items)
+
+    # A server without the batch endpoint (or an older one answering it with
+    # another shape) still serves single questions, so ask them one by one.
+    print("  %s -> no batch support, asking one at a time" % label)
+    return [_send_one(url, idx, question, total, top_k, policy) for idx, question in items]
+
+
+def run_batch(
+    url: str,
+    batch_url: str,
+    items: List[Tuple[int, str]],
+    total: int,
+    top_k: int,
+    policy: RequestPolicy,
+    cache: Optional[ResponseCache] = None,
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Answer one group of (question_id, question) pairs; returns a (row, raw item) per question."""
+    for idx, question in items:
+        print("[%s/%s] %s" % (idx, total, question))
+
+    # A question answered alone is stored under url and one answered in a
+    # group under batch_url; either answer is reusable, so check both,
+    # preferring the endpoint this group would hit.
+    lookup = [url, batch_url] if len(items) == 1 else [batch_url, url]
+    outcomes: Dict[int, Tuple[Dict[str, Any], Optional[Dict[str, Any]], str, int]] = {}
+    pending: List[Tuple[int, str]] = []
+    for idx, question in items:
+        cached = None
+        if cache:
+            for endpoint in lookup:
+                cached = cache.get(endpoint, top_k, question)
+                if cached is not None:
+                    break
+        if cached is None:
+            pending.append((idx, question))
+            continue
+        print("  [%s/%s] -> cached" % (idx, total))
+        outcomes[idx] = ({"question": question, "top_k": top_k}, cached[0], "", cached[1])
+
+    if pending:
+        # send_group may post a lone miss, or every question of a group the
+        # server cannot batch, to url; each answer is cached where it came from.
+        sent = send_group(url, batch_url, pending, total, top_k, policy)
+        for (idx, question), (endpoint, payload, item_result, err_msg, sent_with) in zip(pending, sent):
+            outcomes[idx] = (payload, item_result, err_msg, sent_with)
+            if cache and not err_msg and _cacheable(item_result):
+                cache.put(endpoint, top_k, question, item_result, sent_with)
+
+    out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for idx, question in items:
+        payload, item_result, err_msg, sent_with = outcomes[idx]
+        raw_item = {
+            "question_id": idx,
+            "question": question,
+            "request": payload,
+            "error": err_msg,
+            "response": item_result,
+        }
+        out.append((build_row(idx, question, item_result, err_msg, sent_with), raw_item))
+    return out
 
 
 def main() -> int:
@@ -244,57 +699,69 @@ def main() -> int:
     )
 
     url = args.base_url.rstrip("/") + "/" + args.endpoint.lstrip("/")
-    rows: List[Dict[str, Any]] = []
-    raw_items: List[Dict[str, Any]] = []
-
-    print("Benchmark endpoint: %s" % url)
-    print("Questions: %s" % len(questions))
+    batch_url = args.base_url.rstrip("/") + "/" + args.batch_endpoint.lstrip("/")
+    total = len(questions)
+
+    numbered = list(enumerate(questions, start=1))
+    batch_size = max(1, args.batch_size)
+    batches = [numbered[i : i + batch_size] for i in range(0, total, batch_size)]
+
+    print("Benchmark endpoint: %s" % (batch_url if batch_size > 1 else url))
+    print("Questions: %s" % total)
+
+    # A delay between requests only makes sense when they are sequential.
+    concurrency = 1 if args.sleep_seconds > 0 else max(1, min(args.concurrency, len(batches)))
+    _pool.size = args.connection_pool_size if args.connection_pool_size is not None else concurrency
+    if args.concurrency > CONCURRENCY_WARN_THRESHOLD:
+        print(
+            "Warning: --concurrency %s is past the ~%s concurrent requests where a single model server "
+            "typically stops gaining throughput; expect queueing rather than speedup."
+            % (args.concurrency, CONCURRENCY_WARN_THRESHOLD),
+            file=sys.stderr,
+        )
     print("")
 
-    for idx, question in enumerate(questions, start=1):
-        payload = {"question": question, "top_k": args.top_k}
-        print("[%s/%s] %s" % (idx, len(questions), question))
-        err_msg = ""
-        result: Optional[Dict[str, Any]] = None
-        started = time.time()
-        try:
-            result = post_json(url, payload, timeout=args.timeout)
-            elapsed = round((time.time() - started) * 1000, 2)
-            print("  -> ok (%sms)" % elapsed)
-        except error.HTTPError as exc:
-            err_msg = "HTTP %s" % exc.code
-            try:
-                body = exc.read().decode("utf-8")
-                err_msg = "%s: %s" % (err_msg, body[:300])
-            except Exception:
-                pass
-            print("  -> error: %s" % err_msg)
-            if args.fail_fast:
-                return 1
-        except Exception as exc:
-            err_msg = "%s: %s" % (type(exc).__name__, str(exc))
-            print("  -> error: %s" % err_msg)
-            if args.fail_fast:
-                return 1
-
-        rows.append(build_row(idx, question, result, err_msg))
-        raw_items.append(
-            {
-                "question_id": idx,
-                "question": question,
-                "request": payload,
-                "error": err_msg,
-                "response": result,
-            }
-        )
-        if args.sleep_seconds > 0 and idx < len(questions):
-            time.sleep(args.sleep_seconds)
+    writer = ResultWriter(csv_path, jsonl_path)
+    stats = RunningStats()
 
-    write_csv(csv_path, rows)
-    write_jsonl(jsonl_path, raw_items)
+    def record(outcomes: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> bool:
+        for row, raw_item in outcomes:
+            stats.add(row)
+            writer.add(row, raw_item)
+        return any(row["error"] for row, _ in outcomes)
+
+    cache = None if args.no_cache else ResponseCache(Path(args.cache_db))
+    policy = RequestPolicy(AdaptiveTimeout(args.min_timeout, args.timeout), args.retries, args.backoff)
+    try:
+        if concurrency <= 1:
+            for number, batch in enumerate(batches, start=1):
+                failed = record(run_batch(url, batch_url, batch, total, args.top_k, policy, cache))
+                if failed and args.fail_fast:
+                    return 1
+                if args.sleep_seconds > 0 and number < len(batches):
+                    time.sleep(args.sleep_seconds)
+        else:
+            # The server spends its time waiting on Gemini, so overlapping
+            # requests cuts wall-clock roughly by the concurrency factor.
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [
+                    pool.submit(run_batch, url, batch_url, batch, total, args.top_k, policy, cache)
+                    for batch in batches
+                ]
+                for future in as_completed(futures):
+                    if record(future.result()) and args.fail_fast:
+                        for pending in futures:
+                            pending.cancel()
+                        return 1
+    finally:
+        writer.close()
+        if cache is not None:
+            cache.close()
 
     print("")
-    print(summarize(rows))
+    print(summarize(stats))
+    if cache is not None:
+        print("Cache hits: %s/%s (%s)" % (cache.hits, total, args.cache_db))
     print("CSV: %s" % csv_path)
     print("JSONL: %s" % jsonl_path)
     return 0
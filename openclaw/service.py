@@ -10,16 +10,66 @@ OpenClaw Worker Service (local runner)
 from __future__ import annotations
 
 import argparse
+import http.client
+import io
 import json
+import os
 import signal
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Dict, Tuple
-from urllib import error, request
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib import error
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except Exception:
+    orjson = None
+    HAS_ORJSON = False
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    HAS_WATCHDOG = True
+except Exception:
+    FileSystemEventHandler = object
+    Observer = None
+    HAS_WATCHDOG = False
+
+
+# Built once rather than per call; compact separators match orjson's output.
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _dumps(obj: Any) -> bytes:
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects a few values stdlib json accepts (e.g. >64-bit ints).
+            pass
+    return _json_encode(obj).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 DEFAULT_EXTENSIONS = (".pdf", ".txt", ".md")
+# Raised when a kept-alive connection was closed by the server between calls.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
 
 
 def parse_args() -> argparse.Namespace:
@@ -30,6 +80,17 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--poll-seconds", type=float, default=5.0, help="Polling interval in seconds.")
     parser.add_argument("--extensions", default=",".join(DEFAULT_EXTENSIONS), help="Comma list of extensions.")
     parser.add_argument("--user-role", default="admin", help="x-user-role header for RBAC-enabled servers.")
+    parser.add_argument(
+        "--quiet-seconds",
+        type=float,
+        default=2.0,
+        help="Wait until the folder has been unchanged this long before syncing, so bulk copies sync once.",
+    )
+    parser.add_argument(
+        "--force-polling",
+        action="store_true",
+        help="Poll the folder even when watchdog is installed.",
+    )
 
     subparsers = parser.add_subparsers(dest="cmd")
     subparsers.add_parser("watch", help="Run folder watcher and sync loop")
@@ -41,51 +102,138 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def post_json(url: str, payload: dict, secret: str, role: str, timeout: float = 180.0) -> dict:
-    body = json.dumps(payload).encode("utf-8")
-    req = request.Request(
-        url,
-        data=body,
-        headers={
-            "Content-Type": "application/json",
-            "x-openclaw-secret": secret,
-            "x-user-role": role,
-        },
-        method="POST",
-    )
-    with request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8")
-        return json.loads(raw)
-
-
-def get_json(url: str, secret: str, role: str, timeout: float = 30.0) -> dict:
-    req = request.Request(
-        url,
-        headers={
-            "x-openclaw-secret": secret,
-            "x-user-role": role,
-        },
-        method="GET",
-    )
-    with request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8")
-        return json.loads(raw)
+class _ChangeHandler(FileSystemEventHandler):
+    """Collects watchdog events for watched extensions; the worker loop flushes them."""
+
+    def __init__(self, extensions: Tuple[str, ...]) -> None:
+        super().__init__()
+        self.extensions = extensions
+        self.lock = threading.Lock()
+        self.pending: Set[str] = set()
+        self.last_event = 0.0
+
+    # Only content-changing events count. on_any_event would also see the
+    # opened/closed-without-write events raised when the server reads the
+    # files it was just asked to sync, and re-trigger the sync forever.
+    def on_created(self, event: Any) -> None:
+        self._record(event)
+
+    def on_modified(self, event: Any) -> None:
+        self._record(event)
+
+    def on_moved(self, event: Any) -> None:
+        self._record(event)
+
+    def on_deleted(self, event: Any) -> None:
+        self._record(event)
+
+    def on_closed(self, event: Any) -> None:
+        # Closed after write (watchdog >= 2.1 on Linux).
+        self._record(event)
+
+    def _record(self, event: Any) -> None:
+        if event.is_directory:
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        matched = [str(p) for p in paths if p and str(p).lower().endswith(self.extensions)]
+        if not matched:
+            return
+        with self.lock:
+            self.pending.update(matched)
+            self.last_event = time.monotonic()
+
+    def take_if_quiet(self, quiet_seconds: float) -> Set[str]:
+        with self.lock:
+            if not self.pending or time.monotonic() - self.last_event < quiet_seconds:
+                return set()
+            pending, self.pending = self.pending, set()
+            return pending
 
 
 class Worker:
     def __init__(self, base_url: str, secret: str, watch_dir: Path, extensions: Tuple[str, ...], role: str) -> None:
         self.base_url = base_url.rstrip("/")
+        self.urls = {
+            "handshake": "%s/api/openclaw/handshake" % self.base_url,
+            "sync": "%s/api/openclaw/sync-folder" % self.base_url,
+            "ask": "%s/api/openclaw/ask" % self.base_url,
+        }
         self.secret = secret
         self.watch_dir = watch_dir
         self.extensions = tuple(x.lower() for x in extensions)
         self.role = role
         self.running = True
         self.snapshot: Dict[str, Tuple[float, int]] = {}
+        self._scan_hash = 0
+        # One keep-alive connection per (scheme, host, port), reused by
+        # handshake, sync and ask instead of a new socket per urlopen.
+        self._conns: Dict[Tuple[str, str, Optional[int]], http.client.HTTPConnection] = {}
+        # url -> (connection key, request path); each URL is parsed once.
+        self._targets: Dict[str, Tuple[Tuple[str, str, Optional[int]], str]] = {}
 
     def stop(self, *_: object) -> None:
         self.running = False
 
-    def run(self, poll_seconds: float) -> int:
+    def close(self) -> None:
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
+
+    def post_json(self, url: str, payload: dict, timeout: float = 180.0) -> dict:
+        body = _dumps(payload)
+        return self._request("POST", url, body, {"Content-Type": "application/json"}, timeout)
+
+    def get_json(self, url: str, timeout: float = 30.0) -> dict:
+        return self._request("GET", url, None, {}, timeout)
+
+    def _conn(self, url: str, timeout: float) -> Tuple[http.client.HTTPConnection, str]:
+        target = self._targets.get(url)
+        if target is None:
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path = "%s?%s" % (path, parts.query)
+            target = self._targets[url] = ((parts.scheme, parts.hostname or "", parts.port), path)
+        key, path = target
+        conn = self._conns.get(key)
+        if conn is None:
+            scheme, host, port = key
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = self._conns[key] = cls(host, port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, path
+
+    def _request(self, method: str, url: str, body: Optional[bytes], headers: Dict[str, str], timeout: float) -> dict:
+        headers = dict(headers)
+        headers.update(
+            {
+                "Connection": "keep-alive",
+                "x-openclaw-secret": self.secret,
+                "x-user-role": self.role,
+            }
+        )
+        for attempt in range(2):
+            conn, path = self._conn(url, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                break
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+        if resp.status >= 400:
+            # Same error type urlopen raised, so callers keep their handling.
+            raise error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(raw))
+        return _loads(raw)
+
+    def run(self, poll_seconds: float, quiet_seconds: float = 2.0, force_polling: bool = False) -> int:
         if not self.watch_dir.exists() or not self.watch_dir.is_dir():
             print("Watch dir not found: %s" % self.watch_dir, file=sys.stderr)
             return 2
@@ -94,29 +242,70 @@ class Worker:
         signal.signal(signal.SIGTERM, self.stop)
 
         try:
-            hello = get_json(
-                "%s/api/openclaw/handshake" % self.base_url,
-                secret=self.secret,
-                role=self.role,
-            )
+            hello = self.get_json(self.urls["handshake"])
             print("Handshake OK:", hello)
         except Exception as exc:
             print("Handshake failed: %s" % exc, file=sys.stderr)
             return 1
 
         self.snapshot = self._scan()
+        self._scan_hash = self._fingerprint(self.snapshot)
         self._sync(reason="startup")
-        print("Watching %s every %.1fs ..." % (self.watch_dir, poll_seconds))
 
+        if HAS_WATCHDOG and not force_polling:
+            self._watch_events(quiet_seconds)
+        else:
+            self._watch_polling(poll_seconds, quiet_seconds)
+
+        print("Worker stopped.")
+        return 0
+
+    def _watch_events(self, quiet_seconds: float) -> None:
+        # Kernel-delivered events (inotify/FSEvents) replace re-stat'ing every
+        # file each interval. Syncs still run on this thread, which owns the
+        # HTTP connections.
+        handler = _ChangeHandler(self.extensions)
+        observer = Observer()
+        observer.schedule(handler, str(self.watch_dir), recursive=False)
+        observer.start()
+        print("Watching %s for filesystem events ..." % self.watch_dir)
+        try:
+            while self.running:
+                changed = handler.take_if_quiet(quiet_seconds)
+                if changed:
+                    self._sync_changed({Path(p).name for p in changed})
+                time.sleep(0.1)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def _watch_polling(self, poll_seconds: float, quiet_seconds: float) -> None:
+        print("Watching %s every %.1fs ..." % (self.watch_dir, poll_seconds))
+        # Changes accumulate until the folder has been quiet for
+        # quiet_seconds, so a bulk drop of N files is one sync, not N.
+        dirty: Set[str] = set()
+        last_change = 0.0
         while self.running:
             current = self._scan()
-            if current != self.snapshot:
+            fingerprint = self._fingerprint(current)
+            if fingerprint != self._scan_hash:
+                # Symmetric difference of (name, (mtime, size)) pairs: the
+                # names added, modified or removed since the last scan.
+                dirty |= {name for name, _ in current.items() ^ self.snapshot.items()}
                 self.snapshot = current
-                self._sync(reason="filesystem_change")
-            time.sleep(poll_seconds)
+                self._scan_hash = fingerprint
+                last_change = time.monotonic()
+            if dirty and time.monotonic() - last_change >= quiet_seconds:
+                self._sync_changed(dirty)
+                dirty = set()
+            # Re-check sooner while a sync is pending so it is not held back a full poll.
+            time.sleep(min(poll_seconds, quiet_seconds) if dirty else poll_seconds)
 
-        print("Worker stopped.")
-        return 0
+    def _sync_changed(self, names: Set[str]) -> None:
+        # Deleted files need no server work; ingest only what still exists.
+        present = sorted(name for name in names if (self.watch_dir / name).is_file())
+        if present:
+            self._sync(reason="filesystem_change", files=present)
 
     def ask(self, question: str, mode: str, top_k: int, benchmark: bool) -> int:
         payload = {
@@ -126,13 +315,7 @@ class Worker:
             "benchmark": benchmark,
         }
         try:
-            result = post_json(
-                "%s/api/openclaw/ask" % self.base_url,
-                payload=payload,
-                secret=self.secret,
-                role=self.role,
-                timeout=240.0,
-            )
+            result = self.post_json(self.urls["ask"], payload=payload, timeout=240.0)
             print(json.dumps(result, indent=2, ensure_ascii=False))
             return 0
         except error.HTTPError as exc:
@@ -143,30 +326,33 @@ class Worker:
             print("Ask failed: %s" % exc, file=sys.stderr)
             return 1
 
+    @staticmethod
+    def _fingerprint(state: Dict[str, Tuple[float, int]]) -> int:
+        # Order-independent, so the scan needs no sort; idle polls compare
+        # one int instead of diffing the whole snapshot.
+        return hash(frozenset(state.items()))
+
     def _scan(self) -> Dict[str, Tuple[float, int]]:
+        # Order is irrelevant to the dict comparison, so no sort; scandir's
+        # entries carry the file type without an extra stat per name.
         state: Dict[str, Tuple[float, int]] = {}
-        for p in sorted(self.watch_dir.iterdir()):
-            if not p.is_file():
-                continue
-            if p.suffix.lower() not in self.extensions:
-                continue
-            stat = p.stat()
-            state[p.name] = (stat.st_mtime, stat.st_size)
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                state[entry.name] = (stat.st_mtime, stat.st_size)
         return state
 
-    def _sync(self, reason: str) -> None:
-        payload = {
+    def _sync(self, reason: str, files: Optional[List[str]] = None) -> None:
+        payload: Dict[str, Any] = {
             "folder_path": str(self.watch_dir),
             "extensions": list(self.extensions),
         }
+        if files is not None:
+            payload["files"] = files
         try:
-            result = post_json(
-                "%s/api/openclaw/sync-folder" % self.base_url,
-                payload=payload,
-                secret=self.secret,
-                role=self.role,
-                timeout=240.0,
-            )
+            result = self.post_json(self.urls["sync"], payload=payload, timeout=240.0)
             print("Sync (%s): ingested=%s" % (reason, result.get("ingested_count")))
         except Exception as exc:
             print("Sync error (%s): %s" % (reason, exc), file=sys.stderr)
@@ -184,16 +370,23 @@ def main() -> int:
         role=args.user_role,
     )
 
-    if args.cmd == "ask":
-        return worker.ask(
-            question=args.question,
-            mode=args.mode,
-            top_k=args.top_k,
-            benchmark=args.benchmark,
-        )
+    try:
+        if args.cmd == "ask":
+            return worker.ask(
+                question=args.question,
+                mode=args.mode,
+                top_k=args.top_k,
+                benchmark=args.benchmark,
+            )
 
-    # Default behavior and explicit "watch" subcommand both run the watcher loop.
-    return worker.run(poll_seconds=args.poll_seconds)
+        # Default behavior and explicit "watch" subcommand both run the watcher loop.
+        return worker.run(
+            poll_seconds=args.poll_seconds,
+            quiet_seconds=args.quiet_seconds,
+            force_polling=args.force_polling,
+        )
+    finally:
+        worker.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import random
+import re
+import unittest
+
+from app.document_store import DocumentStore
+
+# The original five-pass redactor, kept verbatim as the reference.
+_RE_SSN = re.compile(r"\b\d{3}-\d{2}-\d{4}\b")
+_RE_PHONE = re.compile(r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b")
+_RE_EMAIL = re.compile(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", re.IGNORECASE)
+_RE_MRN = re.compile(r"\b(?:MRN|Medical\s*Record\s*Number)\s*[:#]?\s*[A-Z0-9-]{4,}\b", re.IGNORECASE)
+_RE_DOB = re.compile(
+    r"\b(?:DOB|Date\s*of\s*Birth)\s*[:#]?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b",
+    re.IGNORECASE,
+)
+
+
+def _reference_redact(text: str) -> str:
+    redacted = text
+    redacted = _RE_SSN.sub("[REDACTED_SSN]", redacted)
+    redacted = _RE_PHONE.sub("[REDACTED_PHONE]", redacted)
+    redacted = _RE_EMAIL.sub("[REDACTED_EMAIL]", redacted)
+    redacted = _RE_MRN.sub("MRN [REDACTED]", redacted)
+    redacted = _RE_DOB.sub("DOB [REDACTED]", redacted)
+    return redacted
+
+
+_TOKENS = [
+    "MRN", "MRN:", "mrn#", "Medical Record Number", "DOB", "DOB:", "Date of Birth", "dob ",
+    "123-45-6789", "555-123-4567", "(555) 123-4567", "+1 555.123.4567", "5551234567",
+    "12/01/1990", "1-2-90", "A1B2C3D4", "jane.doe@example.org", "x@y.co", "@", ".",
+    "-", ":", "#", " ", "  ", "\t", "/", "patient", "sepsis", "SEP-1", "0", "42", "9999",
+]
+
+
+class RedactPiiTest(unittest.TestCase):
+    def test_known_overlaps(self) -> None:
+        for text in (
+            "MRN-5551234567-DOB12/01/1990",
+            "MRN: 123-45-6789",
+            "DOB 12/01/1990 phone 555-123-4567 mail jane@example.org",
+            "MRN A1B2C3D4jane@example.org",
+            "Protocol text with no identifiers at all.",
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(DocumentStore._redact_pii(text), _reference_redact(text))
+
+    def test_matches_five_pass_reference_on_random_glued_tokens(self) -> None:
+        rng = random.Random(20260415)
+        for _ in range(20000):
+            text = "".join(rng.choice(_TOKENS) for _ in range(rng.randint(1, 8)))
+            self.assertEqual(DocumentStore._redact_pii(text), _reference_redact(text), text)
+
+
+if __name__ == "__main__":
+    unittest.main()